@@ -1,11 +1,83 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+import hashlib
 import os
+import tempfile
+
+# Where this copy of the app lives; separate installs get separate cache files
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 
 class Settings(BaseSettings):
     fal_api_key: str = ""
     fal_base_url: str = "https://fal.run/fal-ai/fibo"
+    # Endpoint FIBOClient posts to; point it at bench/mock_fibo.py to run offline
+    fibo_base_url: str = "https://fal.run/bria/fibo/generate"
+
+    # Per-operation upstream timeouts (seconds). A client-supplied
+    # X-Request-Budget-Ms header can only shorten these, never extend them.
+    inspire_timeout: float = 60.0
+    refine_timeout: float = 120.0
+    generate_timeout: float = 120.0
+
+    # Hedged requests: once an operation has enough latency samples, a
+    # duplicate seeded request is fired after its observed p95 latency, for
+    # at most hedge_max_fraction of calls.
+    hedge_enabled: bool = False
+    hedge_min_samples: int = 20
+    hedge_min_delay: float = 0.5
+    hedge_max_fraction: float = 0.05
+
+    # Upstream slot scheduler. Interactive requests go ahead of background
+    # work (X-Priority: background), clients (X-API-Key) share each class by
+    # weight, and quota_rate > 0 enables a per-client token bucket. Keys not
+    # listed in scheduler_api_keys or scheduler_client_weights count as the
+    # caller's address.
+    scheduler_capacity: int = 8
+    scheduler_interactive_reserve: int = 1
+    scheduler_api_keys: list[str] = []
+    scheduler_client_weights: dict[str, float] = {}
+    quota_rate: float = 0.0
+    quota_burst: float = 10.0
+
+    # Near-duplicate reuse: uploads whose perceptual hashes are within
+    # phash_max_distance bits of an earlier extraction reuse its DNA.
+    phash_enabled: bool = True
+    phash_max_distance: int = 6
+    phash_index_size: int = 4096
+
+    # Video extraction: histogram distance (0-1) that counts as a cut, the
+    # shortest allowed shot, and how many keyframes are extracted at once.
+    video_cut_threshold: float = 0.35
+    video_min_shot_frames: int = 12
+    video_max_concurrency: int = 4
+    video_keyframe_max_size: int = 1280
+
+    # Batch extraction from ZIP/tar archives
+    batch_max_concurrency: int = 4
+    batch_max_image_size: int = 2048
+    batch_max_image_bytes: int = 50 * 1024 * 1024
+
+    # Import numpy/PIL/video support in the background once the app is ready
+    preload_heavy_modules: bool = True
+
+    # Cache shared by all worker processes on the host (SQLite file).
+    # Entry limits are per namespace: extraction, generation and blob.
+    # Generations (sync_mode data URIs) and blobs are also capped in total bytes.
+    cache_path: str = os.path.join(
+        tempfile.gettempdir(), f"cinemorph-cache-{hashlib.sha256(APP_DIR.encode()).hexdigest()[:12]}.sqlite3"
+    )
+    cache_ttl: float = 86400.0
+    cache_max_entries: int = 10000
+    generation_cache_ttl: float = 3600.0
+    generation_cache_max_total_bytes: int = 256 * 1024 * 1024
+    blob_cache_ttl: float = 3600.0
+    blob_cache_max_entries: int = 256
+    blob_cache_max_bytes: int = 25 * 1024 * 1024
+    blob_cache_max_total_bytes: int = 512 * 1024 * 1024
+
+    # Compiled prompts kept in memory per worker, keyed by DNA fingerprint
+    prompt_cache_size: int = 1024
 
     class Config:
         env_file = ".env"
@@ -1,15 +1,86 @@
-from fastapi import FastAPI
+import time
+
+IMPORT_STARTED = time.perf_counter()
+
+import asyncio
+import importlib
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 import os
 
 from app.routers.endpoints import router
 from app.config import get_settings
+from app.services.fibo import close_http_client, get_http_client
+from app.services.cache import get_shared_cache
+from app.services.presets import warm_presets
+from app.services.latency import BUDGET_HEADER, set_deadline, reset_deadline
+from app.services.scheduler import (
+    CLIENT_HEADER, PRIORITY_HEADER, get_scheduler, parse_priority, set_request_identity, reset_request_identity
+)
+
+# Imported lazily by the endpoints that need them, then preloaded in the
+# background once the app is ready so the first such request doesn't pay
+HEAVY_MODULES = ("PIL.Image", "app.services.phash", "app.services.video", "app.services.batch")
+
+
+def preload_heavy_modules() -> None:
+    for name in HEAVY_MODULES:
+        importlib.import_module(name)
+    from app.services.phash import get_phash_index
+    get_phash_index()
+
+
+async def preload_in_background(app: FastAPI) -> None:
+    try:
+        await asyncio.to_thread(preload_heavy_modules)
+    except Exception as e:
+        # Not fatal: the endpoints import what they need on first use
+        print(f"WARNING: preloading heavy modules failed: {e}")
+    app.state.preloaded = True
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm settings, presets and shared clients, then start serving"""
+    settings = get_settings()
+    api_key_set = bool(settings.fal_api_key)
+    print(f"CineMorph API starting...")
+    print(f"FAL_API_KEY configured: {api_key_set}")
+    print(f"FIBO endpoint: {settings.fibo_base_url}")
+    if not api_key_set:
+        print("WARNING: FAL_API_KEY is not set. API calls will fail.")
+
+    warm_presets()
+    get_shared_cache()
+    get_scheduler()
+    get_http_client()
+    app.state.startup_ms = round((time.perf_counter() - IMPORT_STARTED) * 1000.0, 1)
+    app.state.started = True
+    print(f"CineMorph API started in {app.state.startup_ms}ms")
+
+    preload = None
+    app.state.preloaded = not settings.preload_heavy_modules
+    if settings.preload_heavy_modules:
+        preload = asyncio.create_task(preload_in_background(app))
+    try:
+        yield
+    finally:
+        app.state.started = False
+        if preload is not None:
+            await asyncio.gather(preload, return_exceptions=True)
+        await close_http_client()
+
 
 app = FastAPI(
     title="CineMorph",
     description="Cinematography DNA extraction and remixing API",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
+app.state.started = False
+app.state.preloaded = False
 
 app.add_middleware(
     CORSMiddleware,
@@ -22,15 +93,38 @@ app.add_middleware(
 app.include_router(router)
 
 
-@app.on_event("startup")
-async def startup_event():
-    """Log configuration status on startup"""
-    settings = get_settings()
-    api_key_set = bool(settings.fal_api_key)
-    print(f"CineMorph API starting...")
-    print(f"FAL_API_KEY configured: {api_key_set}")
-    if not api_key_set:
-        print("WARNING: FAL_API_KEY is not set. API calls will fail.")
+@app.middleware("http")
+async def request_deadline(request: Request, call_next):
+    """Propagate an optional client-supplied time budget to upstream calls"""
+    budget = request.headers.get(BUDGET_HEADER)
+    if budget is None:
+        return await call_next(request)
+    try:
+        budget_ms = float(budget)
+    except ValueError:
+        budget_ms = 0.0
+    if budget_ms <= 0:
+        return JSONResponse({"detail": f"{BUDGET_HEADER} must be a positive number"}, status_code=400)
+
+    token = set_deadline(budget_ms)
+    try:
+        return await call_next(request)
+    finally:
+        reset_deadline(token)
+
+
+@app.middleware("http")
+async def request_identity(request: Request, call_next):
+    """Tag the request with its client and priority class for the upstream scheduler"""
+    client_id = get_scheduler().client_id(
+        request.headers.get(CLIENT_HEADER),
+        request.client.host if request.client else None,
+    )
+    tokens = set_request_identity(client_id, parse_priority(request.headers.get(PRIORITY_HEADER)))
+    try:
+        return await call_next(request)
+    finally:
+        reset_request_identity(tokens)
 
 
 @app.get("/")
@@ -45,3 +139,18 @@ async def health():
         "status": "ok",
         "fal_api_configured": bool(settings.fal_api_key)
     }
+
+
+@app.get("/ready")
+async def ready():
+    """
+    Readiness: the background preload has finished, so the first image
+    request won't pay for it, and the shared cache can be read. uvicorn
+    only accepts connections once lifespan startup is done; the preload is
+    what this can actually be waiting for.
+    """
+    if not app.state.started or not app.state.preloaded:
+        return JSONResponse({"status": "starting"}, status_code=503)
+    if not await asyncio.to_thread(get_shared_cache().ping):
+        return JSONResponse({"status": "cache unavailable"}, status_code=503)
+    return {"status": "ready", "startup_ms": app.state.startup_ms}
@@ -1,10 +1,14 @@
-from pydantic import BaseModel, Field, HttpUrl
-from typing import Optional
+from pydantic import BaseModel, ConfigDict, Field, HttpUrl
+from typing import Any, Optional
 from enum import Enum
+from functools import cached_property
+import hashlib
 import random
 
 
 class CameraParams(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     angle: str = "eye_level"
     fov: str = "normal"
     lens_mm: int = 50
@@ -13,6 +17,8 @@ class CameraParams(BaseModel):
 
 
 class LightingParams(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     direction: str = "front"
     intensity: float = Field(default=0.7, ge=0.0, le=1.0)
     color_temp: int = Field(default=2000, ge=2000, le=10000)
@@ -21,7 +27,9 @@ class LightingParams(BaseModel):
 
 
 class ColorParams(BaseModel):
-    palette: list[str] = ["neutral"]
+    model_config = ConfigDict(frozen=True)
+
+    palette: tuple[str, ...] = ("neutral",)
     saturation: float = Field(default=0.5, ge=0.0, le=1.0)
     contrast: float = Field(default=0.5, ge=0.0, le=1.0)
     mood: str = "neutral"
@@ -29,6 +37,8 @@ class ColorParams(BaseModel):
 
 
 class CompositionParams(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     framing: str = "centered"
     rule_of_thirds: bool = True
     symmetry: float = Field(default=0.5, ge=0.0, le=1.0)
@@ -36,6 +46,8 @@ class CompositionParams(BaseModel):
 
 
 class AtmosphereParams(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     weather: str = "clear"
     particles: str = "none"
     haze: float = Field(default=0.0, ge=0.0, le=1.0)
@@ -43,12 +55,31 @@ class AtmosphereParams(BaseModel):
 
 
 class CinematographyDNA(BaseModel):
+    """Immutable, so its fingerprint can be computed once and reused as a cache key"""
+    model_config = ConfigDict(frozen=True)
+
     camera: CameraParams = Field(default_factory=CameraParams)
     lighting: LightingParams = Field(default_factory=LightingParams)
     color: ColorParams = Field(default_factory=ColorParams)
     composition: CompositionParams = Field(default_factory=CompositionParams)
     atmosphere: AtmosphereParams = Field(default_factory=AtmosphereParams)
 
+    @cached_property
+    def fingerprint(self) -> str:
+        """sha256 of the canonical JSON: equal DNA gives equal fingerprints however it was built"""
+        # No free-form dicts, so pydantic's field order is already canonical
+        return hashlib.sha256(self.model_dump_json().encode()).hexdigest()
+
+    def __hash__(self) -> int:
+        return hash(self.fingerprint)
+
+    def model_copy(self, *, update: Optional[dict[str, Any]] = None, deep: bool = False) -> "CinematographyDNA":
+        copied = super().model_copy(update=update, deep=deep)
+        if update:
+            # The cached fingerprint was copied along with the old values
+            copied.__dict__.pop("fingerprint", None)
+        return copied
+
 
 class ExtractRequest(BaseModel):
     image_url: Optional[HttpUrl] = None
@@ -114,6 +145,37 @@ class PresetInfo(BaseModel):
     signature_traits: list[str]
 
 
+class VideoShotResult(BaseModel):
+    """One NDJSON line of /extract/video: a detected shot and its DNA"""
+    shot: int
+    start_time: float
+    end_time: float
+    start_timecode: str
+    end_timecode: str
+    keyframe_time: float
+    source_image_url: str  # The keyframe, for remixing this shot
+    seed: int
+    dna: Optional[CinematographyDNA] = None
+    source_description: Optional[str] = None
+    confidence: Optional[float] = None
+    structured_prompt: Optional[dict] = None
+    error: Optional[str] = None
+
+
+class BatchImageResult(BaseModel):
+    """One NDJSON line of /extract/batch: an archive image and its DNA"""
+    index: int  # Position among the archive's images
+    name: str
+    cursor: int  # Resume point: every image numbered below this has been reported
+    seed: Optional[int] = None
+    dna: Optional[CinematographyDNA] = None
+    source_description: Optional[str] = None
+    confidence: Optional[float] = None
+    structured_prompt: Optional[dict] = None
+    duplicate_of: Optional[int] = None  # Earlier image in this archive with identical content
+    error: Optional[str] = None
+
+
 class ExportFormat(str, Enum):
     TIFF = "tiff"
     PNG = "png"
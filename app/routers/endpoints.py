@@ -1,9 +1,13 @@
+import asyncio
 import httpx
+import math
+import shutil
+import tempfile
 from io import BytesIO
 from fastapi import APIRouter, HTTPException, UploadFile, File, Form
 from fastapi.responses import StreamingResponse
 from typing import Optional
-from PIL import Image
+from urllib.parse import urlparse
 
 from app.models import (
     ExtractRequest, ExtractResponse, RemixRequest, RemixResponse,
@@ -11,19 +15,50 @@ from app.models import (
     ExportRequest, ExportFormat, PresetInfo, CinematographyDNA,
     generate_seed
 )
-from app.services.fibo import FIBOClient, blend_dna
+from app.config import get_settings
+from app.services.cache import cache_key, get_shared_cache
+from app.services.fibo import FIBOClient, blend_dna, get_http_client
+from app.services.extraction import inspire_with_reuse
+from app.services.latency import DeadlineExceeded, latency_tracker
+from app.services.scheduler import QuotaExceeded, get_scheduler
 from app.services.presets import load_preset, list_presets, apply_preset
+from app.services.prompts import get_prompt_compiler
 
 router = APIRouter()
 
 
-async def upload_to_temp(file: UploadFile) -> str:
-    """Convert uploaded file to data URI for FIBO API"""
+async def upload_to_temp(file: UploadFile) -> tuple[str, bytes]:
+    """Convert uploaded file to data URI for FIBO API, returning the raw bytes too"""
     content = await file.read()
     import base64
     b64 = base64.b64encode(content).decode()
     mime = file.content_type or "image/jpeg"
-    return f"data:{mime};base64,{b64}"
+    return f"data:{mime};base64,{b64}", content
+
+
+async def spool_upload(file: UploadFile):
+    """
+    Copy an upload to a temporary file owned by the caller. The request's own
+    file is closed once the endpoint returns, while a streamed response may
+    still be reading it.
+    """
+    spooled = tempfile.TemporaryFile()
+    await asyncio.to_thread(shutil.copyfileobj, file.file, spooled)
+    spooled.seek(0)
+    return spooled
+
+
+async def resolve_image(image: Optional[UploadFile], image_url: Optional[str]) -> tuple[str, Optional[bytes]]:
+    """URL to send to FIBO, plus the image bytes when they are available locally"""
+    if image:
+        return await upload_to_temp(image)
+    if image_url.startswith("data:"):
+        import base64
+        try:
+            return image_url, base64.b64decode(image_url.split(",", 1)[1])
+        except Exception:
+            return image_url, None
+    return image_url, None
 
 
 @router.post("/extract", response_model=ExtractResponse)
@@ -38,17 +73,14 @@ async def extract_dna(
     if not image and not image_url:
         raise HTTPException(400, "Provide either image file or image_url")
 
-    url = image_url
-    if image:
-        url = await upload_to_temp(image)
+    url, image_bytes = await resolve_image(image, image_url)
 
     # Generate a seed for this extraction session
     seed = generate_seed()
 
     client = FIBOClient()
     try:
-        response = await client.inspire(url, seed)
-        dna, description, confidence, structured_prompt = client.parse_inspire_response(response)
+        dna, description, confidence, structured_prompt = await inspire_with_reuse(client, url, seed, image_bytes)
 
         return ExtractResponse(
             dna=dna,
@@ -61,6 +93,76 @@ async def extract_dna(
         )
     except httpx.HTTPStatusError as e:
         raise HTTPException(e.response.status_code, f"FIBO API error: {e.response.text}")
+    except (httpx.TimeoutException, DeadlineExceeded):
+        raise HTTPException(504, "FIBO API did not respond within the request deadline")
+    except QuotaExceeded as e:
+        raise HTTPException(429, str(e), headers={"Retry-After": str(math.ceil(e.retry_after))})
+
+
+@router.post("/extract/video")
+async def extract_video_dna(
+    video: Optional[UploadFile] = File(None),
+    video_url: Optional[str] = Form(None)
+):
+    """
+    Extract cinematographic DNA per shot of a video.
+    Shots are detected locally and only one keyframe per shot is sent to FIBO.
+    Streams one JSON object per shot (NDJSON) as soon as it is ready.
+    """
+    if not video and not video_url:
+        raise HTTPException(400, "Provide either video file or video_url")
+    if not video:
+        parsed = urlparse(video_url)
+        if parsed.scheme not in ("http", "https") or not parsed.hostname:
+            raise HTTPException(400, "video_url must be an http or https URL")
+
+    client = FIBOClient()
+
+    from app.services.video import stream_video_dna
+
+    source = await spool_upload(video) if video else video_url
+
+    async def body():
+        try:
+            async for line in stream_video_dna(client, source):
+                yield line
+        finally:
+            if video:
+                source.close()
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+
+@router.post("/extract/batch")
+async def extract_batch_dna(
+    archive: UploadFile = File(...),
+    cursor: int = Form(0)
+):
+    """
+    Extract cinematographic DNA from every image in a ZIP or tar archive.
+    Streams one JSON object per image (NDJSON) in completion order. Pass the
+    last `cursor` received to resume an interrupted batch.
+    """
+    if cursor < 0:
+        raise HTTPException(400, "cursor must not be negative")
+
+    from app.services.batch import is_archive, stream_batch_dna
+
+    source = await spool_upload(archive)
+    if not await asyncio.to_thread(is_archive, source):
+        source.close()
+        raise HTTPException(400, "archive must be a ZIP or tar file")
+
+    client = FIBOClient()
+
+    async def body():
+        try:
+            async for line in stream_batch_dna(client, source, cursor):
+                yield line
+        finally:
+            source.close()
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
 
 
 @router.post("/remix", response_model=RemixResponse)
@@ -108,6 +210,10 @@ async def remix_image(request: RemixRequest):
         )
     except httpx.HTTPStatusError as e:
         raise HTTPException(e.response.status_code, f"FIBO API error: {e.response.text}")
+    except (httpx.TimeoutException, DeadlineExceeded):
+        raise HTTPException(504, "FIBO API did not respond within the request deadline")
+    except QuotaExceeded as e:
+        raise HTTPException(429, str(e), headers={"Retry-After": str(math.ceil(e.retry_after))})
 
 
 @router.post("/blend", response_model=BlendResponse)
@@ -128,6 +234,10 @@ async def blend_styles(request: BlendRequest):
         )
     except httpx.HTTPStatusError as e:
         raise HTTPException(e.response.status_code, f"FIBO API error: {e.response.text}")
+    except (httpx.TimeoutException, DeadlineExceeded):
+        raise HTTPException(504, "FIBO API did not respond within the request deadline")
+    except QuotaExceeded as e:
+        raise HTTPException(429, str(e), headers={"Retry-After": str(math.ceil(e.retry_after))})
 
 
 @router.post("/preset", response_model=PresetResponse)
@@ -144,9 +254,7 @@ async def apply_style_preset(
     if not preset:
         raise HTTPException(404, f"Preset '{preset_name}' not found")
 
-    url = image_url
-    if image:
-        url = await upload_to_temp(image)
+    url, image_bytes = await resolve_image(image, image_url)
 
     # Generate seed for consistency
     seed = generate_seed()
@@ -154,8 +262,7 @@ async def apply_style_preset(
     client = FIBOClient()
     try:
         # Extract DNA and structured prompt from original image
-        inspire_response = await client.inspire(url, seed)
-        original_dna, _, _, structured_prompt = client.parse_inspire_response(inspire_response)
+        original_dna, _, _, structured_prompt = await inspire_with_reuse(client, url, seed, image_bytes)
 
         # Apply preset to get styled DNA
         styled_dna = apply_preset(original_dna, preset)
@@ -190,6 +297,10 @@ async def apply_style_preset(
         )
     except httpx.HTTPStatusError as e:
         raise HTTPException(e.response.status_code, f"FIBO API error: {e.response.text}")
+    except (httpx.TimeoutException, DeadlineExceeded):
+        raise HTTPException(504, "FIBO API did not respond within the request deadline")
+    except QuotaExceeded as e:
+        raise HTTPException(429, str(e), headers={"Retry-After": str(math.ceil(e.retry_after))})
 
 
 @router.get("/presets", response_model=list[PresetInfo])
@@ -198,10 +309,31 @@ async def get_presets():
     return list_presets()
 
 
+@router.get("/metrics/latency")
+async def get_latency_metrics():
+    """Upstream latency percentiles per operation, for tuning hedging"""
+    return latency_tracker.snapshot()
+
+
+@router.get("/metrics/cache")
+async def get_cache_metrics():
+    """Shared cache size and this worker's hit/miss counts per namespace, plus its compiled-prompt cache"""
+    snapshot = await asyncio.to_thread(get_shared_cache().snapshot)
+    snapshot["prompts"] = get_prompt_compiler().snapshot()
+    return snapshot
+
+
+@router.get("/metrics/scheduler")
+async def get_scheduler_metrics():
+    """Upstream slot usage, queue depth and queue-time percentiles per priority class"""
+    return get_scheduler().snapshot()
+
+
 @router.post("/export")
 async def export_image(request: ExportRequest):
     """Export an image in various professional formats"""
     import base64
+    from PIL import Image
 
     image_url = str(request.image_url)
 
@@ -214,16 +346,22 @@ async def export_image(request: ExportRequest):
         except Exception as e:
             raise HTTPException(400, f"Invalid data URI: {str(e)}")
     else:
-        # Fetch from URL
-        try:
-            async with httpx.AsyncClient(timeout=60.0, follow_redirects=True) as client:
-                response = await client.get(image_url)
+        # Fetch from URL, unless any worker fetched it recently
+        settings = get_settings()
+        cache = get_shared_cache()
+        key = cache_key("blob", image_url)
+        image_data = await asyncio.to_thread(cache.get, "blob", key)
+        if image_data is None:
+            try:
+                response = await get_http_client().get(image_url, timeout=60.0, follow_redirects=True)
                 response.raise_for_status()
                 image_data = response.content
-        except httpx.HTTPStatusError as e:
-            raise HTTPException(400, f"Failed to fetch image: {e.response.status_code}")
-        except Exception as e:
-            raise HTTPException(400, f"Failed to fetch image: {str(e)}")
+            except httpx.HTTPStatusError as e:
+                raise HTTPException(400, f"Failed to fetch image: {e.response.status_code}")
+            except Exception as e:
+                raise HTTPException(400, f"Failed to fetch image: {str(e)}")
+            if len(image_data) <= settings.blob_cache_max_bytes:
+                await asyncio.to_thread(cache.set, "blob", key, image_data, settings.blob_cache_ttl)
 
     try:
         img = Image.open(BytesIO(image_data))
@@ -0,0 +1,187 @@
+import asyncio
+import base64
+import hashlib
+import io
+import logging
+import tarfile
+import zipfile
+from pathlib import PurePosixPath
+from typing import Any, AsyncIterator, BinaryIO, Iterator, Optional
+
+from PIL import Image, ImageOps
+
+from app.config import get_settings
+from app.models import BatchImageResult, generate_seed
+from app.services.extraction import inspire_with_reuse, iterate_in_thread, map_unordered
+from app.services.scheduler import Priority, use_priority
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp", ".tif", ".tiff", ".gif"}
+
+
+class ArchiveImage:
+    def __init__(self, index: int, name: str, data: Optional[bytes] = None, error: Optional[str] = None):
+        self.index = index
+        self.name = name
+        self.data = data  # Normalized JPEG
+        self.error = error
+
+
+def _is_image_name(name: str) -> bool:
+    path = PurePosixPath(name)
+    if any(part.startswith(".") or part == "__MACOSX" for part in path.parts):
+        return False
+    return path.suffix.lower() in IMAGE_EXTENSIONS
+
+
+def is_archive(archive: BinaryIO) -> bool:
+    """Whether `archive` opens as a ZIP or tar file; leaves it rewound"""
+    try:
+        if zipfile.is_zipfile(archive):
+            return True
+        archive.seek(0)
+        try:
+            tarfile.open(fileobj=archive, mode="r:*").close()
+        except tarfile.TarError:
+            return False
+        return True
+    finally:
+        archive.seek(0)
+
+
+def _iter_entries(archive: BinaryIO) -> Iterator[tuple[str, int, Any]]:
+    """(name, size, opener) for every image entry, in archive order, read straight from the archive"""
+    if zipfile.is_zipfile(archive):
+        archive.seek(0)
+        with zipfile.ZipFile(archive) as zf:
+            for info in zf.infolist():
+                if not info.is_dir() and _is_image_name(info.filename):
+                    yield info.filename, info.file_size, lambda info=info: zf.open(info)
+        return
+
+    archive.seek(0)
+    try:
+        tf = tarfile.open(fileobj=archive, mode="r:*")
+    except tarfile.TarError:
+        raise ValueError("not a ZIP or tar file")
+    with tf:
+        for member in tf:
+            if member.isfile() and _is_image_name(member.name):
+                yield member.name, member.size, lambda member=member: tf.extractfile(member)
+
+
+def normalize_image(data: bytes, max_size: int) -> bytes:
+    """Decode, orient, downscale and re-encode as JPEG so equal images become equal bytes"""
+    with Image.open(io.BytesIO(data)) as img:
+        img.draft("RGB", (max_size, max_size))
+        img = ImageOps.exif_transpose(img).convert("RGB")
+    img.thumbnail((max_size, max_size), Image.LANCZOS)
+    output = io.BytesIO()
+    img.save(output, format="JPEG", quality=90)
+    return output.getvalue()
+
+
+def iter_archive_images(
+    archive: BinaryIO,
+    start: int,
+    max_size: int,
+    max_bytes: int
+) -> Iterator[ArchiveImage]:
+    """
+    Yield normalized images from a ZIP or tar archive without extracting it
+    to disk. Images are numbered in archive order; those before `start` are
+    skipped without being read.
+    """
+    for index, (name, size, opener) in enumerate(_iter_entries(archive)):
+        if index < start:
+            continue
+        if size > max_bytes:
+            yield ArchiveImage(index, name, error=f"Image is larger than {max_bytes} bytes")
+            continue
+        try:
+            with opener() as entry:
+                data = entry.read()
+            yield ArchiveImage(index, name, normalize_image(data, max_size))
+        except Exception as e:
+            logger.warning("Could not read batch image %s: %s", name, e)
+            yield ArchiveImage(index, name, error="Could not read image")
+
+
+async def stream_batch_dna(client: Any, archive: BinaryIO, cursor: int = 0) -> AsyncIterator[str]:
+    """
+    Extract DNA from every image in an archive, yielding one NDJSON line per
+    image in completion order. Every line carries a `cursor`: all images
+    numbered below it have been reported, so passing it back resumes the
+    batch without repeating work.
+    """
+    settings = get_settings()
+    use_priority(Priority.BACKGROUND)
+
+    # Identical images in one archive share a single extraction
+    extractions: dict[str, asyncio.Future] = {}
+    first_index: dict[str, int] = {}
+
+    async def extract(image: ArchiveImage) -> BatchImageResult:
+        result = BatchImageResult(index=image.index, name=image.name, cursor=cursor, error=image.error)
+        if image.error:
+            return result
+
+        digest = hashlib.sha256(image.data).hexdigest()
+        if digest in extractions:
+            result.duplicate_of = first_index[digest]
+            extraction = await asyncio.shield(extractions[digest])
+        else:
+            extractions[digest] = asyncio.ensure_future(_extract(client, image.data))
+            first_index[digest] = image.index
+            extraction = await asyncio.shield(extractions[digest])
+
+        if isinstance(extraction, Exception):
+            result.error = "DNA extraction failed"
+            return result
+        dna, description, confidence, structured_prompt, seed = extraction
+        result.dna = dna
+        result.source_description = description
+        result.confidence = confidence
+        result.structured_prompt = structured_prompt
+        result.seed = seed
+        return result
+
+    images = iterate_in_thread(
+        lambda: iter_archive_images(
+            archive,
+            cursor,
+            settings.batch_max_image_size,
+            settings.batch_max_image_bytes,
+        ),
+        maxsize=settings.batch_max_concurrency,
+    )
+
+    finished: set[int] = set()
+    low_water = cursor
+    try:
+        async for result in map_unordered(images, extract, settings.batch_max_concurrency):
+            finished.add(result.index)
+            while low_water in finished:
+                finished.discard(low_water)
+                low_water += 1
+            result.cursor = low_water
+            yield result.model_dump_json() + "\n"
+    except Exception as e:
+        # The archive itself is unreadable from here on
+        logger.warning("Batch archive failed: %s", e)
+        yield BatchImageResult(index=-1, name="", cursor=low_water, error="Could not read archive").model_dump_json() + "\n"
+    finally:
+        for extraction in extractions.values():
+            extraction.cancel()
+
+
+async def _extract(client: Any, image: bytes) -> Any:
+    """(dna, description, confidence, structured_prompt, seed), or the exception raised"""
+    url = f"data:image/jpeg;base64,{base64.b64encode(image).decode()}"
+    seed = generate_seed()
+    try:
+        return (*await inspire_with_reuse(client, url, seed, image), seed)
+    except Exception as e:
+        logger.warning("Batch extraction failed: %s", e)
+        return e
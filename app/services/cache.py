@@ -0,0 +1,338 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from functools import lru_cache
+from typing import Any, Optional
+
+from app.config import get_settings
+from app.services.latency import DeadlineExceeded, operation_timeout
+from app.services.scheduler import Priority, current_priority
+
+# Reading an entry refreshes its LRU position at most this often, so hot
+# keys don't turn every read into a write
+_TOUCH_INTERVAL = 30.0
+# Eviction runs on every Nth write from a process
+_EVICT_EVERY = 32
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    expires_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entries_lru ON entries (namespace, accessed_at);
+CREATE TABLE IF NOT EXISTS leases (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS phashes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    phash INTEGER NOT NULL,
+    dhash INTEGER NOT NULL,
+    ref TEXT NOT NULL
+);
+"""
+
+
+def cache_key(*parts: Any) -> str:
+    """Stable key for JSON-serializable parts"""
+    canonical = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def _signed(value: int) -> int:
+    """SQLite integers are signed 64-bit"""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def _unsigned(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+class SharedCache:
+    """
+    Key/value cache in a local SQLite file, shared by every worker process
+    on the host. Each write is a single transaction, so readers see either
+    the old or the new value. Entries expire by TTL and each namespace is
+    trimmed to its entry limit, and optionally a total byte limit, by
+    least-recent use. Leases let one process compute a value while others
+    wait for it instead of repeating the work.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        limits: dict[str, int],
+        default_limit: int,
+        byte_limits: Optional[dict[str, int]] = None
+    ):
+        self.path = path
+        self.limits = limits
+        self.default_limit = default_limit
+        self.byte_limits = byte_limits or {}
+        self.stats: dict[str, dict[str, int]] = defaultdict(lambda: {"hits": 0, "misses": 0})
+        self._local = threading.local()
+        self._writes = 0
+        self._connect().executescript(_SCHEMA)
+
+    @property
+    def owner(self) -> str:
+        return f"{os.getpid()}-{id(self)}"
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 connections can't be shared across threads or forked
+        # processes; keep one per thread, per process
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, namespace: str, key: str) -> Optional[bytes]:
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute(
+            "SELECT value, expires_at, accessed_at FROM entries WHERE namespace = ? AND key = ?",
+            (namespace, key),
+        ).fetchone()
+        if row is None or row[1] < now:
+            self.stats[namespace]["misses"] += 1
+            return None
+        if now - row[2] > _TOUCH_INTERVAL:
+            conn.execute(
+                "UPDATE entries SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                (now, namespace, key),
+            )
+        self.stats[namespace]["hits"] += 1
+        return row[0]
+
+    def set(self, namespace: str, key: str, value: bytes, ttl: float) -> None:
+        byte_limit = self.byte_limits.get(namespace)
+        if byte_limit is not None and len(value) > byte_limit:
+            return  # Would evict everything else and still not fit
+        conn = self._connect()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (namespace, key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+            (namespace, key, value, now + ttl, now),
+        )
+        self._writes += 1
+        # Byte-limited namespaces hold large values, so a few writes can overshoot
+        if byte_limit is not None or self._writes % _EVICT_EVERY == 0:
+            self.evict(namespace)
+
+    def evict(self, namespace: str) -> None:
+        conn = self._connect()
+        limit = self.limits.get(namespace, self.default_limit)
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM entries WHERE namespace = ? AND expires_at < ?", (namespace, time.time()))
+            conn.execute(
+                """DELETE FROM entries WHERE namespace = ? AND key IN (
+                    SELECT key FROM entries WHERE namespace = ? ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )""",
+                (namespace, namespace, limit),
+            )
+            byte_limit = self.byte_limits.get(namespace)
+            if byte_limit is not None:
+                conn.execute(
+                    """DELETE FROM entries WHERE namespace = ? AND key IN (
+                        SELECT key FROM (
+                            SELECT key, SUM(LENGTH(value)) OVER (ORDER BY accessed_at DESC, key) AS total
+                            FROM entries WHERE namespace = ?
+                        ) WHERE total > ?
+                    )""",
+                    (namespace, namespace, byte_limit),
+                )
+
+    def get_json(self, namespace: str, key: str) -> Optional[Any]:
+        value = self.get(namespace, key)
+        return None if value is None else json.loads(value)
+
+    def set_json(self, namespace: str, key: str, value: Any, ttl: float) -> None:
+        self.set(namespace, key, json.dumps(value, separators=(",", ":")).encode(), ttl)
+
+    def claim(self, namespace: str, key: str, lease: float) -> bool:
+        """Try to become the one process computing `key`. Expired leases can be taken over."""
+        conn = self._connect()
+        now = time.time()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT owner, expires_at FROM leases WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            ).fetchone()
+            if row is not None and row[0] != self.owner and row[1] > now:
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO leases (namespace, key, owner, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, self.owner, now + lease),
+            )
+            return True
+
+    def release(self, namespace: str, key: str) -> None:
+        self._connect().execute(
+            "DELETE FROM leases WHERE namespace = ? AND key = ? AND owner = ?",
+            (namespace, key, self.owner),
+        )
+
+    def add_phash(self, phash: int, dhash: int, ref: str, keep: int) -> None:
+        conn = self._connect()
+        cursor = conn.execute(
+            "INSERT INTO phashes (phash, dhash, ref) VALUES (?, ?, ?)",
+            (_signed(phash), _signed(dhash), ref),
+        )
+        if cursor.lastrowid % _EVICT_EVERY == 0:
+            conn.execute("DELETE FROM phashes WHERE id <= ?", (cursor.lastrowid - keep,))
+
+    def phashes_since(self, last_id: int, limit: int) -> list[tuple[int, int, int, str]]:
+        """(id, phash, dhash, ref) rows added after `last_id`, at most the newest `limit`"""
+        rows = self._connect().execute(
+            "SELECT id, phash, dhash, ref FROM phashes WHERE id > ? ORDER BY id DESC LIMIT ?",
+            (last_id, limit),
+        ).fetchall()
+        return [(row_id, _unsigned(p), _unsigned(d), ref) for row_id, p, d, ref in reversed(rows)]
+
+    def ping(self) -> bool:
+        """Whether the cache file can still be read"""
+        try:
+            self._connect().execute("SELECT 1 FROM entries LIMIT 1").fetchall()
+        except sqlite3.Error:
+            return False
+        return True
+
+    def snapshot(self) -> dict:
+        conn = self._connect()
+        sizes = dict(conn.execute("SELECT namespace, COUNT(*) FROM entries GROUP BY namespace").fetchall())
+        return {
+            "path": self.path,
+            "namespaces": {
+                ns: {"entries": sizes.get(ns, 0), **self.stats.get(ns, {"hits": 0, "misses": 0})}
+                for ns in sorted(set(sizes) | set(self.stats))
+            },
+        }
+
+
+class SingleFlight:
+    """
+    Compute each key once across all workers: the first caller in this
+    process takes the cross-process lease and computes; other callers here
+    share its result, and other processes poll the cache until it appears.
+
+    Only results are shared. If the computing caller fails (its deadline,
+    quota, a timeout, or it went away), waiters compute again under their own
+    request context. Callers never wait behind a less urgent priority class,
+    and never longer than their own timeout.
+    """
+
+    def __init__(self, cache: SharedCache, namespace: str, ttl: float, lease: float = 180.0, poll: float = 0.1):
+        self.cache = cache
+        self.namespace = namespace
+        self.ttl = ttl
+        self.lease = lease
+        self.poll = poll
+        self._inflight: dict[tuple[str, Priority], asyncio.Future] = {}
+
+    async def get(self, key: str) -> Optional[Any]:
+        return await asyncio.to_thread(self.cache.get_json, self.namespace, key)
+
+    async def run(self, key: str, compute, timeout: Optional[float] = None) -> Any:
+        """`timeout` bounds the wait for other callers (default: the lease), shortened by the request deadline"""
+        cached = await self.get(key)
+        if cached is not None:
+            return cached
+
+        give_up = time.monotonic() + operation_timeout(self.lease if timeout is None else timeout)
+        priority = current_priority()
+        while (shared := self._joinable(key, priority)) is not None:
+            try:
+                return await asyncio.wait_for(asyncio.shield(shared), give_up - time.monotonic())
+            except asyncio.TimeoutError:
+                raise DeadlineExceeded("Request budget exhausted while waiting for a shared result")
+            except asyncio.CancelledError:
+                if not shared.cancelled():
+                    raise
+                # The caller computing it went away; take over
+            except Exception:
+                pass  # It failed in its own context; try in ours
+
+        shared = asyncio.get_running_loop().create_future()
+        self._inflight[(key, priority)] = shared
+        try:
+            result = await self._run_once(key, compute, give_up)
+            shared.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            shared.cancel()
+            raise
+        except Exception as e:
+            shared.set_exception(e)
+            # Waiters only look at it to know they must retry
+            shared.exception()
+            raise
+        finally:
+            del self._inflight[(key, priority)]
+
+    def _joinable(self, key: str, priority: Priority) -> Optional[asyncio.Future]:
+        """An in-flight computation of `key` that is at least as urgent as `priority`"""
+        for leader in Priority:
+            if leader > priority:
+                return None
+            shared = self._inflight.get((key, leader))
+            if shared is not None:
+                return shared
+        return None
+
+    async def _run_once(self, key: str, compute, give_up: float) -> Any:
+        while not await asyncio.to_thread(self.cache.claim, self.namespace, key, self.lease):
+            # Another worker is computing it; wait for its result or for its lease to lapse
+            if time.monotonic() + self.poll > give_up:
+                raise DeadlineExceeded("Request budget exhausted while waiting for another worker")
+            await asyncio.sleep(self.poll)
+            cached = await self.get(key)
+            if cached is not None:
+                return cached
+        try:
+            cached = await self.get(key)
+            if cached is not None:
+                return cached
+            result = await compute()
+            await asyncio.to_thread(self.cache.set_json, self.namespace, key, result, self.ttl)
+            return result
+        finally:
+            await asyncio.to_thread(self.cache.release, self.namespace, key)
+
+
+@lru_cache
+def get_shared_cache() -> SharedCache:
+    settings = get_settings()
+    return SharedCache(
+        settings.cache_path,
+        limits={"blob": settings.blob_cache_max_entries},
+        default_limit=settings.cache_max_entries,
+        byte_limits={
+            "generation": settings.generation_cache_max_total_bytes,
+            "blob": settings.blob_cache_max_total_bytes,
+        },
+    )
+
+
+@lru_cache
+def get_single_flight(namespace: str) -> SingleFlight:
+    settings = get_settings()
+    ttl = settings.generation_cache_ttl if namespace == "generation" else settings.cache_ttl
+    return SingleFlight(get_shared_cache(), namespace, ttl)
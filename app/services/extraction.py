@@ -0,0 +1,167 @@
+import asyncio
+import copy
+import hashlib
+import logging
+import threading
+from typing import AsyncIterator, Awaitable, Callable, Iterator, Optional, TypeVar
+
+from app.config import get_settings
+from app.models import CinematographyDNA
+from app.services.cache import cache_key, get_single_flight
+from app.services.fibo import FIBOClient
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+_DONE = object()
+
+
+async def inspire_with_reuse(
+    client: FIBOClient,
+    image_url: str,
+    seed: int,
+    image_bytes: Optional[bytes] = None
+) -> tuple[CinematographyDNA, str, float, dict]:
+    """
+    Run Inspire on an image, unless it (or a near-duplicate of it) was
+    already extracted by any worker, in which case its DNA and structured
+    prompt are reused. Returns the same tuple as FIBOClient.parse_inspire_response.
+    """
+    # numpy/PIL are only needed once an image actually arrives
+    from app.services.phash import get_phash_index, image_hashes
+
+    flight = get_single_flight("extraction")
+    source = hashlib.sha256(image_bytes).hexdigest() if image_bytes is not None else image_url
+    # Keyed by upstream too: a mock or staging FIBO must not answer for production
+    key = cache_key("inspire", client.base_url, source)
+
+    cached = await flight.get(key)
+    if cached is not None:
+        return _decode_extraction(cached)
+
+    index = get_phash_index()
+    hashes = None
+    if index is not None and image_bytes is not None:
+        try:
+            hashes = await asyncio.to_thread(image_hashes, image_bytes)
+        except Exception as e:
+            # Not something PIL can read; let FIBO decide what to do with it
+            logger.debug("Skipping perceptual hash: %s", e)
+        # No hashes for blank frames either; only exact bytes match those
+
+        if hashes is not None:
+            match = await asyncio.to_thread(index.lookup, hashes)
+            cached = await flight.get(match) if match is not None else None
+            # The index is shared by every upstream; only reuse this one's answers
+            if cached is not None and cached.get("upstream") == client.base_url:
+                return _decode_extraction(cached)
+
+    async def run_inspire() -> dict:
+        response = await client.inspire(image_url, seed)
+        dna, description, confidence, structured_prompt = client.parse_inspire_response(response)
+        return {
+            "dna": dna.model_dump(),
+            "description": description,
+            "confidence": confidence,
+            "structured_prompt": structured_prompt,
+            "upstream": client.base_url,
+        }
+
+    extraction = await flight.run(key, run_inspire, timeout=get_settings().inspire_timeout)
+    if hashes is not None:
+        await asyncio.to_thread(index.add, hashes, key)
+    return _decode_extraction(extraction)
+
+
+def _decode_extraction(extraction: dict) -> tuple[CinematographyDNA, str, float, dict]:
+    return (
+        CinematographyDNA.model_validate(extraction["dna"]),
+        extraction["description"],
+        extraction["confidence"],
+        copy.deepcopy(extraction["structured_prompt"]),
+    )
+
+
+async def iterate_in_thread(factory: Callable[[], Iterator[T]], maxsize: int = 1) -> AsyncIterator[T]:
+    """
+    Drive a blocking iterator in a worker thread. At most `maxsize` items
+    are buffered, so a slow consumer also slows the producer down.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max(maxsize, 1))
+    stopped = threading.Event()
+
+    def produce():
+        try:
+            for item in factory():
+                if stopped.is_set():
+                    return
+                asyncio.run_coroutine_threadsafe(queue.put((item, None)), loop).result()
+            error = None
+        except BaseException as e:
+            error = e
+        if not stopped.is_set():
+            asyncio.run_coroutine_threadsafe(queue.put((_DONE, error)), loop).result()
+
+    producer = loop.run_in_executor(None, produce)
+    try:
+        while True:
+            item, error = await queue.get()
+            if item is _DONE:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stopped.set()
+        # Unblock a producer waiting on a full queue so the thread can exit
+        while not queue.empty():
+            queue.get_nowait()
+        await asyncio.shield(producer)
+
+
+async def map_unordered(
+    items: AsyncIterator[T],
+    func: Callable[[T], Awaitable[R]],
+    limit: int
+) -> AsyncIterator[R]:
+    """
+    Apply `func` to items with at most `limit` calls in flight, yielding
+    results as they complete. `func` should handle its own errors.
+    """
+    iterator = items.__aiter__()
+    pending: set[asyncio.Task] = set()
+    fetch: Optional[asyncio.Future] = None
+    exhausted = False
+    failure: Optional[BaseException] = None
+    try:
+        while True:
+            if fetch is None and not exhausted and len(pending) < limit:
+                fetch = asyncio.ensure_future(iterator.__anext__())
+            waiting = pending | {fetch} if fetch is not None else set(pending)
+            if not waiting:
+                break
+
+            done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+            if fetch in done:
+                try:
+                    pending.add(asyncio.create_task(func(fetch.result())))
+                except StopAsyncIteration:
+                    exhausted = True
+                except Exception as e:
+                    # Finish what is already in flight before reporting it
+                    exhausted = True
+                    failure = e
+                fetch = None
+            for task in done & pending:
+                pending.discard(task)
+                yield task.result()
+        if failure is not None:
+            raise failure
+    finally:
+        if fetch is not None:
+            fetch.cancel()
+        for task in pending:
+            task.cancel()
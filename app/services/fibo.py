@@ -1,19 +1,146 @@
+import asyncio
+import copy
+import hashlib
 import httpx
+import time
+from functools import lru_cache
 from typing import Optional
 from app.config import get_settings
+from app.services.cache import cache_key, get_single_flight
+from app.services.latency import DeadlineExceeded, HedgeBudget, latency_tracker, operation_timeout, hedged
+from app.services.prompts import build_modification_instruction, get_prompt_compiler
+from app.services.scheduler import get_scheduler
 from app.models import CinematographyDNA, CameraParams, LightingParams, ColorParams, CompositionParams, AtmosphereParams
 
 
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Process-wide pooled HTTP client, so upstream calls reuse connections"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=120.0,
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=16)
+        )
+    return _http_client
+
+
+@lru_cache
+def get_hedge_budget() -> HedgeBudget:
+    return HedgeBudget(get_settings().hedge_max_fraction)
+
+
+async def close_http_client() -> None:
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
 class FIBOClient:
     def __init__(self):
         self.settings = get_settings()
         if not self.settings.fal_api_key:
             raise ValueError("FAL_API_KEY environment variable is not set")
-        self.base_url = "https://fal.run/bria/fibo/generate"
+        self.base_url = self.settings.fibo_base_url
         self.headers = {
             "Authorization": f"Key {self.settings.fal_api_key}",
             "Content-Type": "application/json"
         }
+        self.scheduler = get_scheduler()
+        self.timeouts = {
+            "inspire": self.settings.inspire_timeout,
+            "refine": self.settings.refine_timeout,
+            "generate": self.settings.generate_timeout,
+            "generate_with_reference": self.settings.generate_timeout,
+        }
+
+    async def _post(self, operation: str, payload: dict, prompt_key: Optional[tuple] = None) -> dict:
+        """
+        POST to FIBO under the operation's deadline. Seeded generations are
+        deterministic, so they are cached across workers and may be hedged
+        once latency stats are warm. Inspire is cached by inspire_with_reuse.
+        `prompt_key` stands in for the prompt in the cache key, e.g. the DNA
+        fingerprint plus any extra text, so the prompt isn't hashed again.
+        """
+        if operation == "inspire" or "seed" not in payload:
+            return await self._call(operation, payload)
+        key = cache_key(operation, self.base_url, self._key_payload(payload, prompt_key))
+        return await get_single_flight("generation").run(
+            key, lambda: self._call(operation, payload), timeout=self.timeouts[operation]
+        )
+
+    @staticmethod
+    def _key_payload(payload: dict, prompt_key: Optional[tuple]) -> dict:
+        keyed = dict(payload)
+        if prompt_key is not None:
+            keyed["prompt"] = prompt_key
+        if "image_url" in keyed:
+            # Reference images are often multi-MB data URIs; hash them directly
+            # rather than escaping them into the canonical JSON
+            keyed["image_url"] = hashlib.sha256(keyed["image_url"].encode()).hexdigest()
+        return keyed
+
+    async def _call(self, operation: str, payload: dict) -> dict:
+        """
+        One upstream call, possibly hedged. Latency is recorded end to end,
+        including queueing, hedges and upstream timeouts, so the p95 that sets
+        the hedge delay reflects what callers actually waited. Calls cut short
+        by the caller's own budget say nothing about upstream and are skipped.
+        """
+        self.scheduler.check_quota()
+        delay = self._hedge_delay(operation) if "seed" in payload else None
+        started = time.monotonic()
+        # One deadline for the whole call; a hedge doesn't get a fresh one
+        expires_at = started + operation_timeout(self.timeouts[operation])
+        try:
+            if delay is None:
+                result = await self._attempt(operation, payload, expires_at)
+            else:
+                get_hedge_budget().on_call()
+                result = await hedged(lambda: self._attempt(operation, payload, expires_at), delay, get_hedge_budget())
+        except (httpx.TimeoutException, DeadlineExceeded):
+            elapsed = time.monotonic() - started
+            if elapsed >= self.timeouts[operation]:
+                latency_tracker.record(operation, elapsed)
+            raise
+        latency_tracker.record(operation, time.monotonic() - started)
+        return result
+
+    async def _attempt(self, operation: str, payload: dict, expires_at: float) -> dict:
+        """
+        Queue for a slot and POST, all by `expires_at`. httpx timeouts apply
+        per phase and the read timer restarts with every chunk, so a trickling
+        response would outlive them; the whole attempt is bounded here instead.
+        """
+        try:
+            async with asyncio.timeout(expires_at - time.monotonic()):
+                # Time spent waiting for a slot comes out of the request's share
+                async with self.scheduler.slot(timeout=expires_at - time.monotonic()):
+                    remaining = expires_at - time.monotonic()
+                    if remaining <= 0:
+                        raise DeadlineExceeded("Operation timeout spent while queued for an upstream slot")
+                    response = await get_http_client().post(
+                        self.base_url,
+                        headers=self.headers,
+                        json=payload,
+                        timeout=remaining
+                    )
+                    response.raise_for_status()
+                    return response.json()
+        except TimeoutError:
+            raise DeadlineExceeded("Upstream call did not finish within its deadline")
+
+    def _hedge_delay(self, operation: str) -> Optional[float]:
+        """Adaptive hedge delay (the operation's p95), or None to not hedge"""
+        if not self.settings.hedge_enabled:
+            return None
+        if latency_tracker.count(operation) < self.settings.hedge_min_samples:
+            return None
+        p95 = latency_tracker.percentile(operation, 95)
+        return max(p95, self.settings.hedge_min_delay)
 
     async def inspire(self, image_url: str, seed: Optional[int] = None) -> dict:
         """Extract structured prompt from an image (Inspire mode)"""
@@ -25,14 +152,7 @@ class FIBOClient:
         if seed is not None:
             payload["seed"] = seed
 
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            response = await client.post(
-                self.base_url,
-                headers=self.headers,
-                json=payload
-            )
-            response.raise_for_status()
-            return response.json()
+        return await self._post("inspire", payload)
 
     async def refine(
         self,
@@ -50,10 +170,10 @@ class FIBOClient:
         modification_instruction = self._build_modification_instruction(modifications)
 
         # Build the full prompt with the modified DNA
-        base_prompt = self._dna_to_prompt(modified_dna)
+        compiled = get_prompt_compiler().compile(modified_dna)
 
         # Combine: describe what to change + full scene description
-        full_prompt = f"{modification_instruction}. {base_prompt}"
+        full_prompt = f"{modification_instruction}. {compiled.prompt}"
 
         payload = {
             "image_url": source_image_url,  # CRITICAL: Use original image as reference
@@ -69,37 +189,16 @@ class FIBOClient:
         if original_structured_prompt:
             payload["structured_prompt"] = original_structured_prompt
 
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            response = await client.post(
-                self.base_url,
-                headers=self.headers,
-                json=payload
-            )
-            response.raise_for_status()
-            return response.json()
+        return await self._post("refine", payload, (compiled.fingerprint, modification_instruction))
 
     def _build_modification_instruction(self, modifications: dict) -> str:
         """Build a natural language instruction for the modifications"""
-        if not modifications:
-            return "Maintain the exact same scene"
-
-        changes = []
-        for key, value in modifications.items():
-            # Parse the key (e.g., "lighting.time_of_day" -> "lighting time of day")
-            readable_key = key.replace(".", " ").replace("_", " ")
-            # Format the value
-            if isinstance(value, str):
-                readable_value = value.replace("_", " ")
-            else:
-                readable_value = str(value)
-            changes.append(f"change {readable_key} to {readable_value}")
-
-        return "Keep the same scene and subjects, but " + ", ".join(changes)
+        return build_modification_instruction(modifications)
 
     async def generate(self, dna: CinematographyDNA, prompt: Optional[str] = None, seed: Optional[int] = None) -> dict:
         """Generate image from DNA parameters (for blend mode)"""
-        base_prompt = self._dna_to_prompt(dna)
-        full_prompt = f"{prompt}. {base_prompt}" if prompt else base_prompt
+        compiled = get_prompt_compiler().compile(dna)
+        full_prompt = f"{prompt}. {compiled.prompt}" if prompt else compiled.prompt
 
         payload = {
             "prompt": full_prompt,
@@ -108,14 +207,7 @@ class FIBOClient:
         if seed is not None:
             payload["seed"] = seed
 
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            response = await client.post(
-                self.base_url,
-                headers=self.headers,
-                json=payload
-            )
-            response.raise_for_status()
-            return response.json()
+        return await self._post("generate", payload, (compiled.fingerprint, prompt))
 
     async def generate_with_reference(
         self,
@@ -125,8 +217,8 @@ class FIBOClient:
         prompt: Optional[str] = None
     ) -> dict:
         """Generate image with original as reference (for preset mode)"""
-        base_prompt = self._dna_to_prompt(dna)
-        full_prompt = f"{prompt}. {base_prompt}" if prompt else base_prompt
+        compiled = get_prompt_compiler().compile(dna)
+        full_prompt = f"{prompt}. {compiled.prompt}" if prompt else compiled.prompt
 
         payload = {
             "image_url": source_image_url,
@@ -136,65 +228,19 @@ class FIBOClient:
             "image_guidance_scale": 1.5,
         }
 
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            response = await client.post(
-                self.base_url,
-                headers=self.headers,
-                json=payload
-            )
-            response.raise_for_status()
-            return response.json()
+        return await self._post("generate_with_reference", payload, (compiled.fingerprint, prompt))
 
     def _dna_to_prompt(self, dna: CinematographyDNA, modifications: dict = None) -> str:
         """Convert DNA to a descriptive prompt for FIBO"""
-        palette = ", ".join(dna.color.palette) if dna.color.palette else "neutral"
-
-        parts = [
-            f"A cinematic {dna.camera.shot_type} shot",
-            f"camera angle: {dna.camera.angle}",
-            f"focal length: {dna.camera.lens_mm}mm",
-            f"depth of field: {dna.camera.depth_of_field}",
-            f"lighting: {dna.lighting.style} {dna.lighting.direction} light",
-            f"time of day: {dna.lighting.time_of_day}",
-            f"color palette: {palette}",
-            f"mood: {dna.color.mood}",
-            f"color grade: {dna.color.grade}",
-            f"environment: {dna.atmosphere.environment}",
-            f"weather: {dna.atmosphere.weather}",
-        ]
-
+        prompt = get_prompt_compiler().compile(dna).prompt
         if modifications:
             mod_parts = [f"{k}: {v}" for k, v in modifications.items()]
-            parts.append(f"with modifications: {', '.join(mod_parts)}")
-
-        return ". ".join(parts)
+            prompt += f". with modifications: {', '.join(mod_parts)}"
+        return prompt
 
     def _dna_to_structured_prompt(self, dna: CinematographyDNA) -> dict:
         """Convert our DNA format to FIBO's structured_prompt format"""
-        palette_str = ", ".join(dna.color.palette) if dna.color.palette else "neutral tones"
-
-        return {
-            "short_description": f"A {dna.camera.shot_type} shot with {dna.lighting.style} lighting in {dna.atmosphere.environment} setting",
-            "lighting": {
-                "conditions": f"{dna.lighting.style} lighting, {dna.lighting.time_of_day}, intensity {dna.lighting.intensity}, {dna.lighting.color_temp}K",
-                "direction": dna.lighting.direction,
-                "shadows": "soft" if dna.lighting.intensity < 0.5 else "defined"
-            },
-            "photographic_characteristics": {
-                "camera_angle": dna.camera.angle,
-                "lens_focal_length": f"{dna.camera.lens_mm}mm",
-                "depth_of_field": dna.camera.depth_of_field,
-                "focus": dna.camera.shot_type
-            },
-            "aesthetics": {
-                "composition": f"{dna.composition.framing} framing, symmetry {dna.composition.symmetry}",
-                "color_scheme": f"{palette_str}, saturation {dna.color.saturation}, contrast {dna.color.contrast}, {dna.color.grade} grade",
-                "mood_atmosphere": dna.color.mood
-            },
-            "background_setting": f"{dna.atmosphere.environment} environment, {dna.atmosphere.weather} weather, haze {dna.atmosphere.haze}, {dna.atmosphere.particles} particles",
-            "context": f"{dna.camera.shot_type} shot, {dna.composition.framing} composition",
-            "style_medium": dna.color.grade
-        }
+        return copy.deepcopy(get_prompt_compiler().compile(dna).structured_prompt)
 
     def parse_inspire_response(self, response: dict) -> tuple[CinematographyDNA, str, float, dict]:
         """Parse FIBO's response and extract DNA from structured_prompt
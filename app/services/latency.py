@@ -0,0 +1,146 @@
+import asyncio
+import math
+import time
+from collections import defaultdict, deque
+from contextvars import ContextVar, Token
+from typing import Awaitable, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+BUDGET_HEADER = "X-Request-Budget-Ms"
+
+
+class DeadlineExceeded(Exception):
+    """Raised when the request budget is spent before an upstream call can start"""
+
+
+class Deadline:
+    """Absolute point in (monotonic) time by which a request must finish"""
+
+    def __init__(self, budget_seconds: float):
+        self.expires_at = time.monotonic() + budget_seconds
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+
+_current_deadline: ContextVar[Optional[Deadline]] = ContextVar("cinemorph_deadline", default=None)
+
+
+def set_deadline(budget_ms: float) -> Token:
+    """Start a deadline for the current request context"""
+    return _current_deadline.set(Deadline(budget_ms / 1000.0))
+
+
+def reset_deadline(token: Token) -> None:
+    _current_deadline.reset(token)
+
+
+def get_deadline() -> Optional[Deadline]:
+    return _current_deadline.get()
+
+
+def operation_timeout(default: float) -> float:
+    """
+    Timeout for the next upstream call: the operation's own timeout,
+    shortened to whatever is left of the request deadline.
+    """
+    deadline = _current_deadline.get()
+    if deadline is None:
+        return default
+    remaining = deadline.remaining()
+    if remaining <= 0:
+        raise DeadlineExceeded("Request budget exhausted before upstream call")
+    return min(default, remaining)
+
+
+class LatencyTracker:
+    """Rolling window of observed latencies per operation"""
+
+    def __init__(self, window: int = 500):
+        self.window = window
+        self._samples: dict[str, deque] = defaultdict(lambda: deque(maxlen=self.window))
+
+    def record(self, operation: str, seconds: float) -> None:
+        self._samples[operation].append(seconds)
+
+    def count(self, operation: str) -> int:
+        return len(self._samples.get(operation, ()))
+
+    def percentile(self, operation: str, pct: float) -> Optional[float]:
+        samples = self._samples.get(operation)
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, max(0, math.ceil(pct / 100.0 * len(ordered)) - 1))
+        return ordered[index]
+
+    def snapshot(self) -> dict:
+        """p50/p95/p99 per operation, in milliseconds"""
+        result = {}
+        for operation in sorted(self._samples):
+            result[operation] = {
+                "count": self.count(operation),
+                **{
+                    f"p{pct}_ms": round(self.percentile(operation, pct) * 1000.0, 1)
+                    for pct in (50, 95, 99)
+                },
+            }
+        return result
+
+
+latency_tracker = LatencyTracker()
+
+
+class HedgeBudget:
+    """
+    Caps hedging to a fraction of calls. Every call earns `fraction` of a
+    hedge, up to `burst` saved, and each hedge spends one. A slow upstream
+    then gets at most that much extra load, however low the hedge delay.
+    """
+
+    def __init__(self, fraction: float, burst: float = 5.0):
+        self.fraction = fraction
+        self.burst = burst
+        self.tokens = 0.0
+        self.calls = 0
+        self.hedges = 0
+
+    def on_call(self) -> None:
+        self.calls += 1
+        self.tokens = min(self.burst, self.tokens + self.fraction)
+
+    def try_spend(self) -> bool:
+        if self.tokens < 1.0:
+            return False
+        self.tokens -= 1.0
+        self.hedges += 1
+        return True
+
+
+async def hedged(call: Callable[[], Awaitable[T]], delay: float, budget: Optional[HedgeBudget] = None) -> T:
+    """
+    Run `call`, and if it has not finished after `delay` seconds start a
+    duplicate, if `budget` allows one. The first successful result wins and
+    the other is cancelled. Only safe for idempotent calls (e.g. seeded
+    generations).
+    """
+    tasks = [asyncio.create_task(call())]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done and (budget is None or budget.try_spend()):
+            tasks.append(asyncio.create_task(call()))
+
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+
+        # Every attempt failed; surface the primary's error
+        return tasks[0].result()
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
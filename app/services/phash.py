@@ -0,0 +1,130 @@
+import io
+import threading
+from functools import lru_cache
+from typing import Optional
+
+import numpy as np
+from PIL import Image
+
+from app.config import get_settings
+from app.services.cache import SharedCache, get_shared_cache
+
+_PHASH_SIZE = 32
+_HASH_SIZE = 8
+# Thumbnails with less grey-level spread than this (0-255) are treated as
+# blank: their DCT coefficients are rounding noise and their dHash is 0
+_MIN_DETAIL = 4.0
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    """Orthonormal DCT-II basis, so a 2-D DCT is two matrix products"""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    basis = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    basis[0] /= np.sqrt(2.0)
+    return basis.astype(np.float32)
+
+
+_DCT = _dct_matrix(_PHASH_SIZE)
+
+
+def _pack(bits: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def image_hashes(data: bytes) -> Optional[tuple[int, int]]:
+    """
+    64-bit pHash and dHash of an encoded image. Both work on a tiny
+    grayscale thumbnail, so re-encodes and resizes of a frame hash alike.
+    Returns None for near-flat images (black, grey, fades), which would
+    all hash alike whatever their colour.
+    """
+    with Image.open(io.BytesIO(data)) as img:
+        # Let the JPEG decoder downscale while decoding instead of afterwards
+        img.draft("L", (_PHASH_SIZE * 2, _PHASH_SIZE * 2))
+        gray = img.convert("L")
+    pixels = np.asarray(gray.resize((_PHASH_SIZE, _PHASH_SIZE), Image.LANCZOS), dtype=np.float32)
+    if pixels.std() < _MIN_DETAIL:
+        return None
+    small = np.asarray(gray.resize((_HASH_SIZE + 1, _HASH_SIZE), Image.LANCZOS), dtype=np.int16)
+
+    # pHash: low-frequency DCT coefficients above/below their median (DC excluded)
+    low = (_DCT @ pixels @ _DCT.T)[:_HASH_SIZE, :_HASH_SIZE].ravel()
+    phash = _pack(low > np.median(low[1:]))
+
+    # dHash: sign of the horizontal gradient
+    dhash = _pack((small[:, 1:] > small[:, :-1]).ravel())
+    return phash, dhash
+
+
+def _popcount(values: np.ndarray) -> np.ndarray:
+    return np.unpackbits(values.view(np.uint8)).reshape(-1, 64).sum(axis=1)
+
+
+class PerceptualIndex:
+    """
+    Fixed-size ring buffer of (pHash, dHash) -> reference. Lookups compare
+    against every stored hash at once; an entry matches when both hashes
+    are within `max_distance` bits. With a shared `store`, entries are
+    written there and every worker mirrors the newest `capacity` of them.
+    """
+
+    def __init__(self, capacity: int, max_distance: int, store: Optional[SharedCache] = None):
+        self.capacity = capacity
+        self.max_distance = max_distance
+        self.store = store
+        self._phashes = np.zeros(capacity, dtype=np.uint64)
+        self._dhashes = np.zeros(capacity, dtype=np.uint64)
+        self._refs: list[Optional[str]] = [None] * capacity
+        self._size = 0
+        self._next = 0
+        self._last_id = 0
+        # Lookups run in worker threads
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def lookup(self, hashes: tuple[int, int]) -> Optional[str]:
+        with self._lock:
+            self._sync()
+            if not self._size:
+                return None
+            phash, dhash = hashes
+            p_dist = _popcount(self._phashes[:self._size] ^ np.uint64(phash))
+            d_dist = _popcount(self._dhashes[:self._size] ^ np.uint64(dhash))
+            candidates = (p_dist <= self.max_distance) & (d_dist <= self.max_distance)
+            if not candidates.any():
+                return None
+            total = np.where(candidates, p_dist + d_dist, 129)
+            return self._refs[int(np.argmin(total))]
+
+    def add(self, hashes: tuple[int, int], ref: str) -> None:
+        with self._lock:
+            if self.store is not None:
+                # Picked up by every worker (this one included) on its next sync
+                self.store.add_phash(*hashes, ref, keep=self.capacity)
+            else:
+                self._insert(hashes, ref)
+
+    def _sync(self) -> None:
+        if self.store is None:
+            return
+        for row_id, phash, dhash, ref in self.store.phashes_since(self._last_id, self.capacity):
+            self._insert((phash, dhash), ref)
+            self._last_id = row_id
+
+    def _insert(self, hashes: tuple[int, int], ref: str) -> None:
+        slot = self._next
+        self._phashes[slot], self._dhashes[slot] = hashes
+        self._refs[slot] = ref
+        self._next = (slot + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+
+@lru_cache
+def get_phash_index() -> Optional[PerceptualIndex]:
+    settings = get_settings()
+    if not settings.phash_enabled:
+        return None
+    return PerceptualIndex(settings.phash_index_size, settings.phash_max_distance, get_shared_cache())
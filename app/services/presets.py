@@ -1,4 +1,6 @@
+import copy
 import json
+from functools import lru_cache
 from pathlib import Path
 from typing import Optional
 from app.models import CinematographyDNA, PresetInfo
@@ -7,24 +9,35 @@ from app.models import CinematographyDNA, PresetInfo
 PRESETS_DIR = Path(__file__).parent.parent / "presets"
 
 
+@lru_cache
+def _preset_cache() -> dict[str, dict]:
+    """All preset files, read once (normally while the app starts up)"""
+    presets = {}
+    for path in sorted(PRESETS_DIR.glob("*.json")):
+        with open(path) as f:
+            presets[path.stem] = json.load(f)
+    return presets
+
+
+def warm_presets() -> int:
+    return len(_preset_cache())
+
+
 def load_preset(name: str) -> Optional[dict]:
-    preset_path = PRESETS_DIR / f"{name}.json"
-    if not preset_path.exists():
+    preset = _preset_cache().get(name)
+    if preset is None:
         return None
-    with open(preset_path) as f:
-        return json.load(f)
+    return copy.deepcopy(preset)
 
 
 def list_presets() -> list[PresetInfo]:
     presets = []
-    for path in PRESETS_DIR.glob("*.json"):
-        with open(path) as f:
-            data = json.load(f)
-            presets.append(PresetInfo(
-                name=path.stem,
-                description=data.get("description", ""),
-                signature_traits=data.get("signature_traits", [])
-            ))
+    for name, data in _preset_cache().items():
+        presets.append(PresetInfo(
+            name=name,
+            description=data.get("description", ""),
+            signature_traits=data.get("signature_traits", [])
+        ))
     return presets
 
 
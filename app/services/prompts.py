@@ -0,0 +1,134 @@
+import json
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional
+
+from app.config import get_settings
+from app.models import CinematographyDNA
+
+
+class CompiledPrompt:
+    """Prompt text and FIBO structured_prompt for one DNA. Shared between callers; treat as read-only."""
+
+    __slots__ = ("fingerprint", "prompt", "structured_prompt")
+
+    def __init__(self, fingerprint: str, prompt: str, structured_prompt: dict):
+        self.fingerprint = fingerprint
+        self.prompt = prompt
+        self.structured_prompt = structured_prompt
+
+
+def dna_to_prompt(dna: CinematographyDNA) -> str:
+    """Convert DNA to a descriptive prompt for FIBO"""
+    palette = ", ".join(dna.color.palette) if dna.color.palette else "neutral"
+
+    parts = [
+        f"A cinematic {dna.camera.shot_type} shot",
+        f"camera angle: {dna.camera.angle}",
+        f"focal length: {dna.camera.lens_mm}mm",
+        f"depth of field: {dna.camera.depth_of_field}",
+        f"lighting: {dna.lighting.style} {dna.lighting.direction} light",
+        f"time of day: {dna.lighting.time_of_day}",
+        f"color palette: {palette}",
+        f"mood: {dna.color.mood}",
+        f"color grade: {dna.color.grade}",
+        f"environment: {dna.atmosphere.environment}",
+        f"weather: {dna.atmosphere.weather}",
+    ]
+    return ". ".join(parts)
+
+
+def dna_to_structured_prompt(dna: CinematographyDNA) -> dict:
+    """Convert our DNA format to FIBO's structured_prompt format"""
+    palette_str = ", ".join(dna.color.palette) if dna.color.palette else "neutral tones"
+
+    return {
+        "short_description": f"A {dna.camera.shot_type} shot with {dna.lighting.style} lighting in {dna.atmosphere.environment} setting",
+        "lighting": {
+            "conditions": f"{dna.lighting.style} lighting, {dna.lighting.time_of_day}, intensity {dna.lighting.intensity}, {dna.lighting.color_temp}K",
+            "direction": dna.lighting.direction,
+            "shadows": "soft" if dna.lighting.intensity < 0.5 else "defined"
+        },
+        "photographic_characteristics": {
+            "camera_angle": dna.camera.angle,
+            "lens_focal_length": f"{dna.camera.lens_mm}mm",
+            "depth_of_field": dna.camera.depth_of_field,
+            "focus": dna.camera.shot_type
+        },
+        "aesthetics": {
+            "composition": f"{dna.composition.framing} framing, symmetry {dna.composition.symmetry}",
+            "color_scheme": f"{palette_str}, saturation {dna.color.saturation}, contrast {dna.color.contrast}, {dna.color.grade} grade",
+            "mood_atmosphere": dna.color.mood
+        },
+        "background_setting": f"{dna.atmosphere.environment} environment, {dna.atmosphere.weather} weather, haze {dna.atmosphere.haze}, {dna.atmosphere.particles} particles",
+        "context": f"{dna.camera.shot_type} shot, {dna.composition.framing} composition",
+        "style_medium": dna.color.grade
+    }
+
+
+@lru_cache(maxsize=1024)
+def _modification_instruction(canonical: str) -> str:
+    # Keyed on the JSON as sent, not sorted: the order of changes shows in the text
+    modifications = json.loads(canonical)
+    if not modifications:
+        return "Maintain the exact same scene"
+
+    changes = []
+    for key, value in modifications.items():
+        # Parse the key (e.g., "lighting.time_of_day" -> "lighting time of day")
+        readable_key = key.replace(".", " ").replace("_", " ")
+        # Format the value
+        if isinstance(value, str):
+            readable_value = value.replace("_", " ")
+        else:
+            readable_value = str(value)
+        changes.append(f"change {readable_key} to {readable_value}")
+
+    return "Keep the same scene and subjects, but " + ", ".join(changes)
+
+
+def build_modification_instruction(modifications: Optional[dict]) -> str:
+    """Build a natural language instruction for the modifications"""
+    return _modification_instruction(json.dumps(modifications or {}, separators=(",", ":")))
+
+
+class PromptCompiler:
+    """
+    Compiles DNA into FIBO prompts once per fingerprint. Remixes, sweeps and
+    batches send the same DNA over and over; the compiled prompts are kept
+    in a bounded LRU so repeats are a dictionary lookup.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._compiled: OrderedDict[str, CompiledPrompt] = OrderedDict()
+
+    def compile(self, dna: CinematographyDNA) -> CompiledPrompt:
+        fingerprint = dna.fingerprint
+        compiled = self._compiled.get(fingerprint)
+        if compiled is not None:
+            self._compiled.move_to_end(fingerprint)
+            self.hits += 1
+            return compiled
+
+        self.misses += 1
+        compiled = CompiledPrompt(fingerprint, dna_to_prompt(dna), dna_to_structured_prompt(dna))
+        self._compiled[fingerprint] = compiled
+        if len(self._compiled) > self.capacity:
+            self._compiled.popitem(last=False)
+        return compiled
+
+    def snapshot(self) -> dict:
+        return {
+            "entries": len(self._compiled),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+@lru_cache
+def get_prompt_compiler() -> PromptCompiler:
+    return PromptCompiler(get_settings().prompt_cache_size)
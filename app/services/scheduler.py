@@ -0,0 +1,250 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from contextvars import ContextVar, Token
+from enum import IntEnum
+from functools import lru_cache
+from typing import Optional
+
+from app.config import get_settings
+from app.services.latency import DeadlineExceeded, LatencyTracker
+
+CLIENT_HEADER = "X-API-Key"
+PRIORITY_HEADER = "X-Priority"
+# Idle per-client state is dropped at most this often
+PRUNE_INTERVAL = 60.0
+
+
+class Priority(IntEnum):
+    """Lower value is served first"""
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
+class QuotaExceeded(Exception):
+    """Raised when a client has used up its token-bucket quota"""
+
+    def __init__(self, client_id: str, retry_after: float):
+        super().__init__(f"Upstream quota exceeded for client '{client_id}'")
+        self.client_id = client_id
+        self.retry_after = retry_after
+
+
+_current_client: ContextVar[str] = ContextVar("cinemorph_client", default="anonymous")
+_current_priority: ContextVar[Priority] = ContextVar("cinemorph_priority", default=Priority.INTERACTIVE)
+
+
+def set_request_identity(client_id: str, priority: Priority) -> tuple[Token, Token]:
+    return _current_client.set(client_id), _current_priority.set(priority)
+
+
+def reset_request_identity(tokens: tuple[Token, Token]) -> None:
+    client_token, priority_token = tokens
+    _current_client.reset(client_token)
+    _current_priority.reset(priority_token)
+
+
+def current_priority() -> Priority:
+    return _current_priority.get()
+
+
+def use_priority(priority: Priority) -> Token:
+    """Override the priority class for the rest of the current context"""
+    return _current_priority.set(priority)
+
+
+def parse_priority(value: Optional[str]) -> Priority:
+    if value and value.strip().lower() == "background":
+        return Priority.BACKGROUND
+    return Priority.INTERACTIVE
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Take one token. Returns 0 on success, else seconds until one is available."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+    def is_full(self, now: float) -> bool:
+        """Refilled completely, i.e. no different from a new bucket"""
+        return self.tokens + (now - self.updated) * self.rate >= self.burst
+
+
+class UpstreamScheduler:
+    """
+    Hands out a fixed number of upstream slots.
+
+    Interactive requests are always dispatched before background ones, and
+    `interactive_reserve` slots are kept free of background work so a burst
+    of bulk jobs cannot fill the pipe. Within a priority class, clients are
+    served by start-time fair queuing weighted per client, so one heavy user
+    only gets their share. Only known API keys identify a client; anything
+    else is attributed to the caller's address, so minting new keys does not
+    buy a fresh quota or share.
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        interactive_reserve: int = 0,
+        weights: Optional[dict[str, float]] = None,
+        quota_rate: float = 0.0,
+        quota_burst: float = 0.0,
+        api_keys: Optional[list[str]] = None,
+    ):
+        self.capacity = capacity
+        self.interactive_reserve = min(interactive_reserve, capacity - 1)
+        self.weights = weights or {}
+        self.known_keys = set(api_keys or ()) | set(self.weights)
+        self.quota_rate = quota_rate
+        self.quota_burst = quota_burst
+        self.in_flight = 0
+        self._queues: dict[Priority, list] = {p: [] for p in Priority}
+        self._virtual_time: dict[Priority, float] = {p: 0.0 for p in Priority}
+        self._last_finish: dict[Priority, dict[str, float]] = {p: defaultdict(float) for p in Priority}
+        self._buckets: dict[str, TokenBucket] = {}
+        self._sequence = itertools.count()
+        self._pruned_at = time.monotonic()
+        self.queue_times = LatencyTracker()
+        self.dispatched: dict[str, int] = defaultdict(int)
+
+    def client_id(self, api_key: Optional[str], address: Optional[str]) -> str:
+        if api_key and api_key in self.known_keys:
+            return api_key
+        return address or "anonymous"
+
+    @asynccontextmanager
+    async def slot(self, timeout: Optional[float] = None):
+        """Hold one upstream slot, for the current client and priority, for the duration of the block"""
+        try:
+            await asyncio.wait_for(self.acquire(_current_client.get(), _current_priority.get()), timeout)
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded("Request budget exhausted while queued for an upstream slot")
+        try:
+            yield
+        finally:
+            self.release()
+
+    def check_quota(self) -> None:
+        """Charge one upstream call to the current client's token bucket"""
+        if self.quota_rate <= 0:
+            return
+        client_id = _current_client.get()
+        self._prune()
+        bucket = self._buckets.get(client_id)
+        if bucket is None:
+            bucket = self._buckets[client_id] = TokenBucket(self.quota_rate, max(self.quota_burst, 1.0))
+        retry_after = bucket.take()
+        if retry_after:
+            raise QuotaExceeded(client_id, retry_after)
+
+    async def acquire(self, client_id: str, priority: Priority) -> None:
+        enqueued = time.monotonic()
+
+        if not self._has_waiters(priority) and self._has_room(priority):
+            self._start(client_id, priority, enqueued)
+            return
+
+        self._prune()
+        weight = self.weights.get(client_id, 1.0)
+        start_tag = max(self._virtual_time[priority], self._last_finish[priority][client_id])
+        self._last_finish[priority][client_id] = start_tag + 1.0 / weight
+
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queues[priority], (start_tag, next(self._sequence), client_id, enqueued, waiter))
+        # Entries left behind by cancelled waiters may have been all that blocked us
+        self._dispatch()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we were cancelled
+                self.release()
+            raise
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._dispatch()
+
+    def _prune(self) -> None:
+        """Drop state of idle clients; it behaves the same as having none"""
+        now = time.monotonic()
+        if now - self._pruned_at < PRUNE_INTERVAL:
+            return
+        self._pruned_at = now
+        for priority in Priority:
+            finish = self._last_finish[priority]
+            if not self._queues[priority]:
+                # No backlog in this class, so nobody is ahead of anybody
+                finish.clear()
+                continue
+            virtual_time = self._virtual_time[priority]
+            for client_id in [c for c, tag in finish.items() if tag <= virtual_time]:
+                del finish[client_id]
+        for client_id in [c for c, bucket in self._buckets.items() if bucket.is_full(now)]:
+            del self._buckets[client_id]
+
+    def _has_room(self, priority: Priority) -> bool:
+        limit = self.capacity
+        if priority != Priority.INTERACTIVE:
+            limit -= self.interactive_reserve
+        return self.in_flight < limit
+
+    def _has_waiters(self, priority: Priority) -> bool:
+        return any(self._queues[p] for p in Priority if p <= priority)
+
+    def _start(self, client_id: str, priority: Priority, enqueued: float) -> None:
+        self.in_flight += 1
+        self.dispatched[priority.name.lower()] += 1
+        self.queue_times.record(priority.name.lower(), time.monotonic() - enqueued)
+
+    def _dispatch(self) -> None:
+        for priority in Priority:
+            queue = self._queues[priority]
+            while queue and self._has_room(priority):
+                start_tag, _, client_id, enqueued, waiter = heapq.heappop(queue)
+                if waiter.done():
+                    continue  # cancelled while queued
+                self._virtual_time[priority] = start_tag
+                self._start(client_id, priority, enqueued)
+                waiter.set_result(None)
+            if queue:
+                # Lower classes wait until this one drains
+                return
+
+    def snapshot(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "interactive_reserve": self.interactive_reserve,
+            "in_flight": self.in_flight,
+            "queued": {p.name.lower(): sum(1 for e in self._queues[p] if not e[-1].done()) for p in Priority},
+            "dispatched": dict(self.dispatched),
+            "queue_time": self.queue_times.snapshot(),
+        }
+
+
+@lru_cache
+def get_scheduler() -> UpstreamScheduler:
+    settings = get_settings()
+    return UpstreamScheduler(
+        capacity=settings.scheduler_capacity,
+        interactive_reserve=settings.scheduler_interactive_reserve,
+        weights=settings.scheduler_client_weights,
+        quota_rate=settings.quota_rate,
+        quota_burst=settings.quota_burst,
+        api_keys=settings.scheduler_api_keys,
+    )
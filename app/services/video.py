@@ -0,0 +1,194 @@
+import asyncio
+import base64
+import io
+import json
+import logging
+from typing import Any, AsyncIterator, Iterator, Optional
+
+import numpy as np
+from PIL import Image
+
+from app.config import get_settings
+from app.models import VideoShotResult, generate_seed
+from app.services.extraction import inspire_with_reuse, iterate_in_thread, map_unordered
+from app.services.scheduler import Priority, use_priority
+
+logger = logging.getLogger(__name__)
+
+# Frames are analysed at this size; cuts survive downsampling, noise mostly doesn't
+ANALYSIS_SIZE = (64, 36)
+# Frames right after a cut often still carry the transition
+SETTLE_FRAMES = 3
+# FFmpeg may only open remote URLs over these; never local files or other protocols
+URL_PROTOCOLS = "http,https,tcp,tls"
+
+
+class ShotDetector:
+    """
+    Streaming hard-cut detector. Each (downsampled RGB) frame is reduced to
+    per-channel colour histograms, and a cut is declared when the histogram
+    distance to the previous frame exceeds `threshold` (0 = identical, 1 =
+    disjoint) and the current shot is at least `min_shot_frames` long.
+    """
+
+    def __init__(self, threshold: float = 0.35, min_shot_frames: int = 12, bins: int = 16):
+        self.threshold = threshold
+        self.min_shot_frames = min_shot_frames
+        self.bins = bins
+        self._previous: Optional[np.ndarray] = None
+        self._shot_length = 0
+
+    def histogram(self, frame: np.ndarray) -> np.ndarray:
+        quantized = (frame.reshape(-1, 3).astype(np.uint16) * self.bins) >> 8
+        offsets = quantized + np.arange(3, dtype=np.uint16) * self.bins
+        counts = np.bincount(offsets.ravel(), minlength=3 * self.bins)
+        return counts / (3.0 * quantized.shape[0])
+
+    def push(self, frame: np.ndarray) -> tuple[bool, float]:
+        """Feed the next frame. Returns (starts_new_shot, distance_to_previous_frame)."""
+        hist = self.histogram(frame)
+        previous, self._previous = self._previous, hist
+        if previous is None:
+            self._shot_length = 1
+            return False, 0.0
+
+        distance = float(np.abs(hist - previous).sum()) / 2.0
+        if distance > self.threshold and self._shot_length >= self.min_shot_frames:
+            self._shot_length = 1
+            return True, distance
+        self._shot_length += 1
+        return False, distance
+
+
+class Shot:
+    def __init__(self, index: int, start_frame: int, start_time: float):
+        self.index = index
+        self.start_frame = start_frame
+        self.start_time = start_time
+        self.end_frame = start_frame
+        self.end_time = start_time
+        self.keyframe: Optional[Image.Image] = None
+        self.keyframe_time = start_time
+        self._keyframe_score = float("inf")
+
+    def offer(self, frame: Any, frame_index: int, time: float, distance: float, max_size: int) -> None:
+        """
+        Consider a decoded frame as this shot's keyframe. The most static
+        frame (smallest change from its predecessor) wins, as it is least
+        likely to be motion-blurred or mid-transition.
+        """
+        self.end_frame = frame_index
+        self.end_time = time
+        settled = frame_index - self.start_frame >= SETTLE_FRAMES
+        score = distance if settled else 1.0 + distance
+        if self.keyframe is not None and score >= self._keyframe_score:
+            return
+        scale = min(1.0, max_size / max(frame.width, frame.height))
+        self.keyframe = frame.to_image(width=int(frame.width * scale), height=int(frame.height * scale))
+        self.keyframe_time = time
+        self._keyframe_score = score
+
+
+def iter_shots(
+    source: Any,
+    threshold: float,
+    min_shot_frames: int,
+    max_size: int
+) -> Iterator[Shot]:
+    """
+    Decode a video frame by frame and yield each shot as soon as the next cut
+    is seen. Only the current shot's keyframe is held in memory. `source` is
+    a file object or an http(s) URL.
+    """
+    import av
+
+    options = {"protocol_whitelist": URL_PROTOCOLS} if isinstance(source, str) else {}
+    detector = ShotDetector(threshold, min_shot_frames)
+    with av.open(source, options=options) as container:
+        stream = container.streams.video[0]
+        stream.thread_type = "AUTO"
+        rate = float(stream.average_rate or 25)
+
+        shot = None
+        for frame_index, frame in enumerate(container.decode(stream)):
+            time = frame.time if frame.time is not None else frame_index / rate
+            small = frame.to_ndarray(width=ANALYSIS_SIZE[0], height=ANALYSIS_SIZE[1], format="rgb24")
+            is_cut, distance = detector.push(small)
+            if shot is None:
+                shot = Shot(0, frame_index, time)
+            elif is_cut:
+                shot.end_time = time
+                yield shot
+                shot = Shot(shot.index + 1, frame_index, time)
+            shot.offer(frame, frame_index, time, distance, max_size)
+
+        if shot is not None:
+            shot.end_time += 1.0 / rate
+            yield shot
+
+
+def timecode(seconds: float) -> str:
+    millis = int(round(seconds * 1000))
+    hours, millis = divmod(millis, 3_600_000)
+    minutes, millis = divmod(millis, 60_000)
+    secs, millis = divmod(millis, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}.{millis:03d}"
+
+
+def _encode_keyframe(image: Image.Image) -> bytes:
+    output = io.BytesIO()
+    image.convert("RGB").save(output, format="JPEG", quality=90)
+    return output.getvalue()
+
+
+async def stream_video_dna(client: Any, source: Any) -> AsyncIterator[str]:
+    """
+    Detect shots in a video and extract DNA from one keyframe per shot,
+    yielding one NDJSON line per shot in completion order. `client` is
+    anything with FIBOClient's inspire/parse_inspire_response.
+    """
+    settings = get_settings()
+    use_priority(Priority.BACKGROUND)
+
+    async def extract_shot(shot: Shot) -> VideoShotResult:
+        image_bytes = await asyncio.to_thread(_encode_keyframe, shot.keyframe)
+        shot.keyframe = None
+        url = f"data:image/jpeg;base64,{base64.b64encode(image_bytes).decode()}"
+        seed = generate_seed()
+        result = VideoShotResult(
+            shot=shot.index,
+            start_time=shot.start_time,
+            end_time=shot.end_time,
+            start_timecode=timecode(shot.start_time),
+            end_timecode=timecode(shot.end_time),
+            keyframe_time=shot.keyframe_time,
+            source_image_url=url,
+            seed=seed,
+        )
+        try:
+            dna, description, confidence, structured_prompt = await inspire_with_reuse(client, url, seed, image_bytes)
+        except Exception as e:
+            logger.warning("Shot %d extraction failed: %s", shot.index, e)
+            result.error = str(e) or type(e).__name__
+            return result
+        result.dna = dna
+        result.source_description = description
+        result.confidence = confidence
+        result.structured_prompt = structured_prompt
+        return result
+
+    shots = iterate_in_thread(
+        lambda: iter_shots(
+            source,
+            settings.video_cut_threshold,
+            settings.video_min_shot_frames,
+            settings.video_keyframe_max_size,
+        ),
+        maxsize=settings.video_max_concurrency,
+    )
+    try:
+        async for result in map_unordered(shots, extract_shot, settings.video_max_concurrency):
+            yield result.model_dump_json() + "\n"
+    except Exception as e:
+        logger.warning("Video decoding failed: %s", e)
+        yield json.dumps({"error": "Could not decode video"}) + "\n"
@@ -0,0 +1,317 @@
+"""
+Load test against a local FIBO stand-in (bench/mock_fibo.py).
+
+Starts the mock and the app (via run.py) as subprocesses. Then, for each
+concurrency level, it drives /extract, /remix, /blend, /preset and /export
+and records RPS, latency percentiles, the app's memory high-water mark and
+upstream call counts. Results are written as JSON to compare across commits:
+
+    python -m bench.load --concurrency 1,8,32 --requests 200
+    python -m bench.load --compare bench/results/<older>.json
+
+Within a level, each endpoint cycles through --distinct inputs, so caches
+see repeats the way real traffic does. Every level uses fresh inputs.
+"""
+import argparse
+import asyncio
+import io
+import json
+import math
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+ENDPOINTS = ["extract", "remix", "blend", "preset", "export"]
+PRESETS = ["kubrick", "nolan", "wes_anderson", "fincher"]
+MODIFICATIONS = [
+    ("lighting.time_of_day", ["dawn", "golden_hour", "dusk", "night"]),
+    ("color.mood", ["tense", "serene", "epic", "noir"]),
+    ("camera.angle", ["low_angle", "high_angle", "dutch_angle"]),
+]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _memory_hwm_kb(pid: int) -> Optional[int]:
+    """Peak resident memory of a process and its children (Linux /proc), in KiB"""
+    total = 0
+    pending = [pid]
+    try:
+        while pending:
+            current = pending.pop()
+            for line in Path(f"/proc/{current}/status").read_text().splitlines():
+                if line.startswith("VmHWM:"):
+                    total += int(line.split()[1])
+            for task in Path(f"/proc/{current}/task").iterdir():
+                children = (task / "children").read_text().split()
+                pending.extend(int(child) for child in children)
+    except (OSError, ValueError):
+        return total or None
+    return total
+
+
+def _percentile(ordered: list[float], pct: float) -> float:
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _still(seed: int) -> bytes:
+    """A distinct film-still-sized JPEG"""
+    from PIL import Image
+
+    rng = random.Random(seed)
+    small = Image.new("RGB", (16, 9))
+    small.putdata([tuple(rng.randrange(256) for _ in range(3)) for _ in range(16 * 9)])
+    output = io.BytesIO()
+    small.resize((1280, 720), Image.BICUBIC).save(output, format="JPEG", quality=88)
+    return output.getvalue()
+
+
+async def _wait_until_up(url: str, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(url)).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+class Workload:
+    """Builds request n of an endpoint for one concurrency level"""
+
+    def __init__(self, level: int, distinct: int, mock_url: str, extraction: dict, other_dna: dict):
+        self.salt = level * 100_000
+        self.distinct = distinct
+        self.mock_url = mock_url
+        self.extraction = extraction
+        self.other_dna = other_dna
+        self._stills: dict[int, bytes] = {}
+
+    def still(self, n: int) -> bytes:
+        key = self.salt + n % self.distinct
+        if key not in self._stills:
+            self._stills[key] = _still(key)
+        return self._stills[key]
+
+    def request(self, endpoint: str, n: int) -> dict:
+        variant = n % self.distinct
+        if endpoint == "extract":
+            return {"files": {"image": ("still.jpg", self.still(n), "image/jpeg")}}
+        if endpoint == "preset":
+            return {
+                "files": {"image": ("still.jpg", self.still(n), "image/jpeg")},
+                "data": {"preset_name": PRESETS[variant % len(PRESETS)]},
+            }
+        if endpoint == "remix":
+            key, values = MODIFICATIONS[variant % len(MODIFICATIONS)]
+            return {"json": {
+                "base_dna": self.extraction["dna"],
+                "modifications": {key: values[variant % len(values)]},
+                "source_image_url": self.extraction["source_image_url"],
+                "seed": self.salt + variant + 1,
+                "original_structured_prompt": self.extraction["structured_prompt"],
+            }}
+        if endpoint == "blend":
+            return {"json": {
+                "dna_a": self.extraction["dna"],
+                "dna_b": self.other_dna,
+                "ratio": round(variant / max(self.distinct, 1), 3),
+            }}
+        if endpoint == "export":
+            return {"json": {"image_url": f"{self.mock_url}/images/bench-{self.salt + variant}.png", "format": "jpeg"}}
+        raise ValueError(endpoint)
+
+
+async def run_level(
+    client: httpx.AsyncClient,
+    endpoint: str,
+    workload: Workload,
+    concurrency: int,
+    requests: int,
+) -> dict:
+    latencies: list[float] = []
+    statuses: dict[str, int] = {}
+    counter = iter(range(requests))
+
+    async def worker():
+        for n in counter:
+            kwargs = workload.request(endpoint, n)
+            started = time.perf_counter()
+            try:
+                response = await client.post(f"/{endpoint}", **kwargs)
+                status = str(response.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    ordered = sorted(latencies)
+    return {
+        "requests": requests,
+        "ok": statuses.get("200", 0),
+        "statuses": statuses,
+        "elapsed_s": round(elapsed, 3),
+        "rps": round(requests / elapsed, 2),
+        "latency_ms": {
+            "mean": round(statistics.fmean(ordered) * 1000.0, 1),
+            "p50": round(_percentile(ordered, 50) * 1000.0, 1),
+            "p95": round(_percentile(ordered, 95) * 1000.0, 1),
+            "p99": round(_percentile(ordered, 99) * 1000.0, 1),
+            "max": round(ordered[-1] * 1000.0, 1),
+        },
+    }
+
+
+async def benchmark(args) -> dict:
+    mock_port, app_port = _free_port(), _free_port()
+    mock_url = f"http://127.0.0.1:{mock_port}"
+    app_url = f"http://127.0.0.1:{app_port}"
+    cache_dir = tempfile.mkdtemp(prefix="cinemorph-bench-")
+
+    mock = subprocess.Popen([
+        sys.executable, "-m", "bench.mock_fibo",
+        "--port", str(mock_port),
+        "--inspire-latency", args.inspire_latency,
+        "--generate-latency", args.generate_latency,
+        "--error-rate", str(args.error_rate),
+    ], cwd=ROOT)
+    env = dict(
+        os.environ,
+        PORT=str(app_port),
+        WEB_CONCURRENCY=str(args.workers),
+        FAL_API_KEY="bench",
+        FIBO_BASE_URL=f"{mock_url}/fibo/generate",
+        CACHE_PATH=os.path.join(cache_dir, "cache.sqlite3"),
+    )
+    app = subprocess.Popen([sys.executable, "run.py"], cwd=ROOT, env=env, stdout=subprocess.DEVNULL)
+
+    results = []
+    try:
+        await _wait_until_up(f"{mock_url}/_stats")
+        await _wait_until_up(f"{app_url}/ready")
+
+        limits = httpx.Limits(max_connections=max(args.concurrency) * 2)
+        async with httpx.AsyncClient(base_url=app_url, timeout=args.timeout, limits=limits) as client, \
+                httpx.AsyncClient(base_url=mock_url) as mock_client:
+            # Seed DNA for /remix and /blend
+            first = (await client.post("/extract", files={"image": ("a.jpg", _still(-1), "image/jpeg")})).json()
+            second = (await client.post("/extract", files={"image": ("b.jpg", _still(-2), "image/jpeg")})).json()
+
+            for level, concurrency in enumerate(args.concurrency):
+                workload = Workload(level + 1, args.distinct, mock_url, first, second["dna"])
+                for endpoint in args.endpoints:
+                    await mock_client.post("/_stats/reset")
+                    result = await run_level(client, endpoint, workload, concurrency, args.requests)
+                    result.update({
+                        "endpoint": endpoint,
+                        "concurrency": concurrency,
+                        "upstream_calls": (await mock_client.get("/_stats")).json()["calls"],
+                        "memory_hwm_kb": _memory_hwm_kb(app.pid),
+                    })
+                    results.append(result)
+                    print(
+                        f"{endpoint:>8} c={concurrency:<4} {result['rps']:>8.2f} rps  "
+                        f"p50 {result['latency_ms']['p50']:>8.1f}ms  p95 {result['latency_ms']['p95']:>8.1f}ms  "
+                        f"p99 {result['latency_ms']['p99']:>8.1f}ms  ok {result['ok']}/{result['requests']}  "
+                        f"upstream {sum(v for k, v in result['upstream_calls'].items() if not k.endswith('_error'))}",
+                        flush=True,
+                    )
+    finally:
+        app.terminate()
+        mock.terminate()
+        app.wait(timeout=30)
+        mock.wait(timeout=30)
+
+    return {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version.split()[0],
+        "config": {
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "distinct": args.distinct,
+            "workers": args.workers,
+            "inspire_latency": args.inspire_latency,
+            "generate_latency": args.generate_latency,
+            "error_rate": args.error_rate,
+        },
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict) -> None:
+    previous = {(r["endpoint"], r["concurrency"]): r for r in baseline["results"]}
+    print(f"\nvs {baseline['commit']} ({baseline['timestamp']})")
+    for result in current["results"]:
+        before = previous.get((result["endpoint"], result["concurrency"]))
+        if before is None:
+            continue
+        rps = (result["rps"] / before["rps"] - 1.0) * 100.0 if before["rps"] else 0.0
+        p95 = (result["latency_ms"]["p95"] / before["latency_ms"]["p95"] - 1.0) * 100.0 if before["latency_ms"]["p95"] else 0.0
+        print(f"{result['endpoint']:>8} c={result['concurrency']:<4} rps {rps:+6.1f}%  p95 {p95:+6.1f}%")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,8,32", type=lambda s: [int(c) for c in s.split(",")])
+    parser.add_argument("--requests", type=int, default=100, help="requests per endpoint per level")
+    parser.add_argument("--distinct", type=int, default=25, help="distinct inputs per endpoint per level")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), type=lambda s: s.split(","))
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--inspire-latency", default="lognormal:900:0.4")
+    parser.add_argument("--generate-latency", default="lognormal:2500:0.5")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--output", type=Path, default=None)
+    parser.add_argument("--compare", type=Path, default=None, help="earlier results file to diff against")
+    args = parser.parse_args()
+
+    unknown = set(args.endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+
+    report = asyncio.run(benchmark(args))
+    output = args.output or RESULTS_DIR / f"{report['commit']}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2) + "\n")
+    print(f"Results written to {output}")
+
+    if args.compare:
+        compare(report, json.loads(args.compare.read_text()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
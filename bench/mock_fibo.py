@@ -0,0 +1,226 @@
+"""
+Local stand-in for the FIBO endpoint, for benchmarks and offline runs.
+
+    python -m bench.mock_fibo --port 9100 --inspire-latency lognormal:900:0.5 --error-rate 0.01
+    fibo_base_url=http://127.0.0.1:9100/fibo/generate uvicorn app.main:app
+
+Every POST is answered like FIBO would: Inspire-style requests (an image and
+no structured prompt) get a structured_prompt, everything else gets an
+image URL served by this process. Latency is drawn per request from the
+configured distribution:
+
+    fixed:<ms>
+    uniform:<min_ms>:<max_ms>
+    lognormal:<median_ms>:<sigma>
+
+GET /_stats returns upstream call counts by kind (inspire, generate, image); POST /_stats/reset clears them.
+"""
+import argparse
+import asyncio
+import hashlib
+import io
+import json
+import math
+import random
+from collections import Counter
+from functools import lru_cache
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+ANGLES = ["eye_level", "low_angle", "high_angle", "dutch_angle", "overhead"]
+SHOT_TYPES = ["extreme_close_up", "close_up", "medium", "medium_wide", "wide", "extreme_wide"]
+DEPTHS = ["shallow", "medium", "deep"]
+LIGHT_DIRECTIONS = ["front", "side", "back", "top", "rim"]
+LIGHT_STYLES = ["natural", "high_key", "low_key", "chiaroscuro", "neon", "practical"]
+TIMES = ["dawn", "day", "golden_hour", "dusk", "night"]
+PALETTES = [["teal", "orange"], ["red", "black"], ["pastel pink", "mint"], ["amber", "brown"], ["blue", "grey"]]
+MOODS = ["tense", "melancholic", "whimsical", "epic", "serene", "noir"]
+GRADES = ["natural", "bleach_bypass", "teal_orange", "desaturated", "warm", "cold"]
+WEATHER = ["clear", "rain", "fog", "snow", "overcast"]
+ENVIRONMENTS = ["interior", "urban street", "desert", "forest", "office", "diner"]
+
+
+class LatencyDistribution:
+    def __init__(self, spec: str):
+        kind, *params = spec.split(":")
+        self.spec = spec
+        self.kind = kind
+        self.params = [float(p) for p in params]
+        if kind not in ("fixed", "uniform", "lognormal"):
+            raise ValueError(f"Unknown latency distribution '{spec}'")
+
+    def sample(self, rng: random.Random) -> float:
+        """Seconds"""
+        if self.kind == "fixed":
+            ms = self.params[0]
+        elif self.kind == "uniform":
+            ms = rng.uniform(self.params[0], self.params[1])
+        else:
+            median, sigma = self.params
+            ms = math.exp(rng.gauss(math.log(median), sigma))
+        return ms / 1000.0
+
+
+class MockConfig:
+    def __init__(
+        self,
+        inspire_latency: str = "lognormal:900:0.4",
+        generate_latency: str = "lognormal:2500:0.5",
+        error_rate: float = 0.0,
+        seed: int = 0,
+        image_size: tuple[int, int] = (1024, 576),
+    ):
+        self.inspire_latency = LatencyDistribution(inspire_latency)
+        self.generate_latency = LatencyDistribution(generate_latency)
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.image_size = image_size
+
+
+config = MockConfig()
+calls: Counter = Counter()
+app = FastAPI(title="Mock FIBO")
+
+
+def _structured_prompt(rng: random.Random) -> dict:
+    shot_type = rng.choice(SHOT_TYPES)
+    style = rng.choice(LIGHT_STYLES)
+    environment = rng.choice(ENVIRONMENTS)
+    weather = rng.choice(WEATHER)
+    focal_length = f"{rng.choice([18, 24, 35, 50, 85, 135])}mm"
+    return {
+        "short_description": f"A {shot_type.replace('_', ' ')} shot of a figure in a {environment}, {style.replace('_', ' ')} lighting",
+        "objects": [
+            {"description": "A lone figure in a long coat", "location": "center", "relative_size": "medium"},
+            {"description": "Practical lamp casting a pool of light", "location": "left", "relative_size": "small"},
+        ],
+        "background_setting": f"{environment}, {weather} weather",
+        "lighting": {
+            "conditions": f"{style} lighting",
+            "direction": rng.choice(LIGHT_DIRECTIONS),
+            "shadows": rng.choice(["soft", "defined", "hard"]),
+            "style": style,
+            "intensity": round(rng.uniform(0.2, 1.0), 2),
+            "time_of_day": rng.choice(TIMES),
+        },
+        "aesthetics": {
+            "composition": rng.choice(["centered", "rule of thirds", "symmetrical", "off-center"]),
+            "color_scheme": "complementary",
+            "mood_atmosphere": rng.choice(MOODS),
+            "color_palette": rng.choice(PALETTES),
+            "saturation": round(rng.uniform(0.1, 0.9), 2),
+            "contrast": round(rng.uniform(0.2, 0.9), 2),
+            "mood": rng.choice(MOODS),
+            "color_grade": rng.choice(GRADES),
+        },
+        "photographic_characteristics": {
+            "depth_of_field": rng.choice(DEPTHS),
+            "focus": "sharp on subject",
+            "camera_angle": rng.choice(ANGLES),
+            "lens_focal_length": focal_length,
+            "focal_length": focal_length,
+            "field_of_view": rng.choice(["narrow", "normal", "wide"]),
+            "shot_type": shot_type,
+        },
+        "style_medium": "photograph",
+        "context": "Film still",
+        "artistic_style": "cinematic",
+    }
+
+
+@lru_cache(maxsize=256)
+def _render_image(name: str) -> bytes:
+    """Deterministic gradient PNG per image name"""
+    from PIL import Image
+
+    width, height = config.image_size
+    digest = hashlib.sha256(name.encode()).digest()
+    top, bottom = digest[:3], digest[3:6]
+    column = Image.new("RGB", (1, height))
+    column.putdata([
+        tuple(int(top[c] + (bottom[c] - top[c]) * y / height) for c in range(3))
+        for y in range(height)
+    ])
+    image = column.resize((width, height), Image.NEAREST)
+    output = io.BytesIO()
+    image.save(output, format="PNG")
+    return output.getvalue()
+
+
+@app.get("/_stats")
+async def stats():
+    return {"calls": dict(calls), "total": sum(calls.values())}
+
+
+@app.post("/_stats/reset")
+async def reset_stats():
+    calls.clear()
+    return {"ok": True}
+
+
+@app.get("/images/{name}")
+async def image(name: str):
+    calls["image"] += 1
+    data = await asyncio.to_thread(_render_image, name)
+    return Response(data, media_type="image/png")
+
+
+@app.post("/{path:path}")
+async def fibo(path: str, request: Request):
+    body = await request.body()
+    payload = json.loads(body or b"{}")
+    inspire = "image_url" in payload and "structured_prompt" not in payload and "Analyze" in payload.get("prompt", "")
+    kind = "inspire" if inspire else "generate"
+    calls[kind] += 1
+
+    # Responses are a function of the request, like a seeded model
+    digest = hashlib.sha256(body).hexdigest()
+    rng = random.Random(digest)
+    latency = config.inspire_latency if inspire else config.generate_latency
+    await asyncio.sleep(latency.sample(config.rng))
+
+    if config.rng.random() < config.error_rate:
+        calls[f"{kind}_error"] += 1
+        return JSONResponse({"detail": "Mock upstream failure"}, status_code=rng.choice([500, 502, 503]))
+
+    seed = payload.get("seed", rng.randint(1, 2**31 - 1))
+    structured = _structured_prompt(rng)
+    if inspire:
+        return {"structured_prompt": structured, "prompt": structured["short_description"], "seed": seed}
+
+    name = f"{digest[:16]}.png"
+    width, height = config.image_size
+    return {
+        "image": {
+            "url": f"{str(request.base_url).rstrip('/')}/images/{name}",
+            "content_type": "image/png",
+            "width": width,
+            "height": height,
+        },
+        "seed": seed,
+        "structured_prompt": payload.get("structured_prompt") or structured,
+        "model": "fibo-mock",
+        "steps": 50,
+        "duration_ms": None,
+    }
+
+
+def main() -> None:
+    global config
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--inspire-latency", default="lognormal:900:0.4")
+    parser.add_argument("--generate-latency", default="lognormal:2500:0.5")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    config = MockConfig(args.inspire_latency, args.generate_latency, args.error_rate, args.seed)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Cold-start benchmark: time from interpreter start to the app serving
+(app.main imported and its lifespan startup finished), in fresh processes.
+The background preload that /ready waits for is switched off here.
+
+    python -m bench.startup                     # check against the baseline
+    python -m bench.startup --update-baseline   # record a new baseline
+
+Exits non-zero when the median exceeds the baseline by more than the
+allowed tolerance, exceeds --max-ms, or when there is no baseline to check.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+BASELINE_PATH = Path(__file__).resolve().parent / "startup_baseline.json"
+# Absolute ceiling for the median ready time, whatever the baseline says
+DEFAULT_MAX_MS = 1500.0
+
+# Runs in a fresh interpreter; prints one JSON line
+PROBE = """
+import asyncio, json, sys, time
+started = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+
+async def warm():
+    async with app.main.app.router.lifespan_context(app.main.app):
+        ready = time.perf_counter()
+        print(json.dumps({
+            "import_ms": (imported - started) * 1000.0,
+            "ready_ms": (ready - started) * 1000.0,
+            "heavy_modules_loaded": sorted(m for m in app.main.HEAVY_MODULES if m in sys.modules),
+        }))
+
+asyncio.run(warm())
+"""
+
+
+def measure(runs: int) -> dict:
+    env = dict(os.environ)
+    env.setdefault("FAL_API_KEY", "startup-benchmark")
+    # The background preload would otherwise race the measurement
+    env["PRELOAD_HEAVY_MODULES"] = "false"
+
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", PROBE],
+            cwd=ROOT, env=env, capture_output=True, text=True, check=True
+        )
+        samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    return {
+        "runs": runs,
+        "import_ms": round(statistics.median(s["import_ms"] for s in samples), 1),
+        "ready_ms": round(statistics.median(s["ready_ms"] for s in samples), 1),
+        "ready_ms_max": round(max(s["ready_ms"] for s in samples), 1),
+        "heavy_modules_loaded": samples[-1]["heavy_modules_loaded"],
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown over the baseline (fraction)")
+    parser.add_argument("--max-ms", type=float, default=DEFAULT_MAX_MS, help="absolute ceiling for the median ready time")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    result = measure(args.runs)
+    print(json.dumps(result, indent=2))
+
+    if args.update_baseline:
+        BASELINE_PATH.write_text(json.dumps(result, indent=2) + "\n")
+        print(f"Baseline written to {BASELINE_PATH}")
+        return 0
+
+    failures = []
+    if result["heavy_modules_loaded"]:
+        failures.append(f"heavy modules imported before ready: {', '.join(result['heavy_modules_loaded'])}")
+    if result["ready_ms"] > args.max_ms:
+        failures.append(f"ready in {result['ready_ms']}ms, ceiling is {args.max_ms}ms")
+    if not BASELINE_PATH.exists():
+        failures.append(f"no baseline at {BASELINE_PATH}; record one with --update-baseline")
+    else:
+        baseline = json.loads(BASELINE_PATH.read_text())
+        limit = baseline["ready_ms"] * (1.0 + args.tolerance)
+        if result["ready_ms"] > limit:
+            failures.append(f"ready in {result['ready_ms']}ms, baseline {baseline['ready_ms']}ms (+{args.tolerance:.0%} allowed)")
+
+    for failure in failures:
+        print(f"REGRESSION: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,4 +3,7 @@ import uvicorn
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8000))
-    uvicorn.run("app.main:app", host="0.0.0.0", port=port)
+    # Workers share extraction/generation/blob caches through a local SQLite
+    # file (see app/services/cache.py), so hit rates hold across processes
+    workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+    uvicorn.run("app.main:app", host="0.0.0.0", port=port, workers=workers)
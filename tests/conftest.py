@@ -0,0 +1,7 @@
+import os
+import tempfile
+
+# Settings are read once per process, so point them somewhere disposable
+# before anything imports the app
+os.environ.setdefault("FAL_API_KEY", "test")
+os.environ.setdefault("CACHE_PATH", os.path.join(tempfile.mkdtemp(prefix="cinemorph-tests-"), "cache.sqlite3"))
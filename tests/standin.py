@@ -0,0 +1,43 @@
+import base64
+import io
+from typing import Optional
+
+from PIL import Image
+
+from app.services.fibo import FIBOClient
+
+
+class StandInFIBOClient:
+    """
+    Offline stand-in for FIBOClient. Inspire answers from the image itself
+    (its mean colour picks the palette and lighting) instead of calling FIBO,
+    and every call is counted.
+    """
+
+    parse_inspire_response = FIBOClient.parse_inspire_response
+    base_url = "standin://fibo"
+
+    def __init__(self):
+        self.inspire_calls = 0
+
+    async def inspire(self, image_url: str, seed: Optional[int] = None) -> dict:
+        self.inspire_calls += 1
+        data = base64.b64decode(image_url.split(",", 1)[1])
+        with Image.open(io.BytesIO(data)) as img:
+            red, green, blue = img.convert("RGB").resize((1, 1), Image.BOX).getpixel((0, 0))
+
+        dominant = ("red", "green", "blue")[max(range(3), key=(red, green, blue).__getitem__)]
+        brightness = (red + green + blue) / 765.0
+        return {
+            "prompt": f"A {dominant} frame",
+            "seed": seed,
+            "structured_prompt": {
+                "short_description": f"A {dominant} frame",
+                "lighting": {
+                    "style": "high_key" if brightness > 0.5 else "low_key",
+                    "intensity": round(brightness, 2),
+                },
+                "aesthetics": {"color_palette": [dominant], "mood": "neutral"},
+                "photographic_characteristics": {"shot_type": "wide", "focal_length": "35mm"},
+            },
+        }
@@ -0,0 +1,106 @@
+import asyncio
+import io
+import json
+import zipfile
+
+import numpy as np
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.main import app
+from app.routers import endpoints
+from app.services.batch import iter_archive_images, stream_batch_dna
+from tests.standin import StandInFIBOClient
+
+RED, GREEN, BLUE = (200, 40, 40), (40, 200, 40), (40, 40, 200)
+
+
+def _image(colour: tuple[int, int, int]) -> bytes:
+    """A PNG with random texture in `colour`, so no two calls share a cache entry"""
+    blocks = np.random.default_rng().integers(-40, 40, (6, 8, 1)) + np.array(colour)
+    image = Image.fromarray(np.clip(blocks, 0, 255).astype(np.uint8)).resize((160, 96), Image.BICUBIC)
+    output = io.BytesIO()
+    image.save(output, format="PNG")
+    return output.getvalue()
+
+
+def _zip(entries: list[tuple[str, bytes]]) -> io.BytesIO:
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        for name, data in entries:
+            zf.writestr(name, data)
+    archive.seek(0)
+    return archive
+
+
+def _run(client, archive, cursor: int = 0) -> list[dict]:
+    async def collect():
+        return [json.loads(line) async for line in stream_batch_dna(client, archive, cursor)]
+
+    return asyncio.run(collect())
+
+
+class SlowRedClient(StandInFIBOClient):
+    """Stand-in whose red images take longer, so later images finish first"""
+
+    async def inspire(self, image_url, seed=None):
+        response = await super().inspire(image_url, seed)
+        if response["structured_prompt"]["aesthetics"]["color_palette"] == ["red"]:
+            await asyncio.sleep(0.2)
+        return response
+
+
+def test_cursor_is_the_low_water_mark():
+    archive = _zip([("a.png", _image(RED)), ("b.png", _image(GREEN)), ("c.png", _image(BLUE))])
+    lines = _run(SlowRedClient(), archive)
+
+    assert sorted(line["index"] for line in lines[:2]) == [1, 2] and lines[2]["index"] == 0
+    assert [line["cursor"] for line in lines] == [0, 0, 3]
+    assert all(line["error"] is None for line in lines)
+
+
+def test_cursor_resumes_without_repeating_work():
+    archive = _zip([("a.png", _image(RED)), ("b.png", _image(GREEN)), ("c.png", _image(BLUE))])
+    client = StandInFIBOClient()
+    lines = _run(client, archive, cursor=2)
+
+    assert [(line["index"], line["name"], line["cursor"]) for line in lines] == [(2, "c.png", 3)]
+    assert lines[0]["dna"]["color"]["palette"] == ["blue"]
+    assert client.inspire_calls == 1
+
+
+def test_identical_images_share_one_extraction():
+    red = _image(RED)
+    archive = _zip([("a.png", red), ("b.png", _image(GREEN)), ("copy/a.png", red)])
+    client = StandInFIBOClient()
+    lines = sorted(_run(client, archive), key=lambda line: line["index"])
+
+    assert [line["duplicate_of"] for line in lines] == [None, None, 0]
+    assert lines[2]["dna"] == lines[0]["dna"]
+    assert client.inspire_calls == 2
+
+
+def test_oversize_and_unreadable_entries_are_reported():
+    archive = _zip([("big.png", _image(RED)), ("broken.jpg", b"not an image"), ("notes.txt", b"skipped")])
+    images = list(iter_archive_images(archive, start=0, max_size=512, max_bytes=64))
+
+    assert [(image.index, image.name) for image in images] == [(0, "big.png"), (1, "broken.jpg")]
+    assert images[0].data is None and images[0].error == "Image is larger than 64 bytes"
+    assert images[1].data is None and images[1].error == "Could not read image"
+
+
+def test_batch_endpoint_rejects_non_archives(monkeypatch):
+    monkeypatch.setattr(endpoints, "FIBOClient", StandInFIBOClient)
+    response = TestClient(app).post("/extract/batch", files={"archive": ("photo.png", _image(RED), "image/png")})
+    assert response.status_code == 400
+
+
+def test_batch_endpoint_streams_results(monkeypatch):
+    monkeypatch.setattr(endpoints, "FIBOClient", StandInFIBOClient)
+    archive = _zip([("a.png", _image(RED)), ("b.png", _image(GREEN))])
+    response = TestClient(app).post("/extract/batch", files={"archive": ("images.zip", archive, "application/zip")})
+
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(line["index"] for line in lines) == [0, 1]
+    assert max(line["cursor"] for line in lines) == 2
@@ -0,0 +1,180 @@
+import asyncio
+import base64
+import io
+import time
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from app.services.cache import SharedCache, SingleFlight
+from app.services.extraction import inspire_with_reuse
+from app.services.scheduler import Priority, use_priority
+from tests.standin import StandInFIBOClient
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return SharedCache(str(tmp_path / "cache.sqlite3"), limits={"small": 2}, default_limit=100, byte_limits={"big": 100})
+
+
+def _flight(cache: SharedCache) -> SingleFlight:
+    return SingleFlight(cache, "flight", ttl=60.0, lease=5.0, poll=0.01)
+
+
+def test_entry_limit_evicts_least_recently_used(cache):
+    for key in "abc":
+        cache.set("small", key, key.encode(), ttl=60.0)
+    cache.evict("small")
+    assert [cache.get("small", key) for key in "abc"] == [None, b"b", b"c"]
+
+
+def test_expired_entries_are_misses(cache):
+    cache.set("other", "gone", b"x", ttl=-1.0)
+    assert cache.get("other", "gone") is None
+
+
+def test_byte_limit_evicts_on_write(cache):
+    for key in "abc":
+        cache.set("big", key, key.encode() * 40, ttl=60.0)
+    assert cache.get("big", "a") is None
+    assert cache.get("big", "b") == b"b" * 40 and cache.get("big", "c") == b"c" * 40
+
+    cache.set("big", "huge", b"x" * 101, ttl=60.0)
+    assert cache.get("big", "huge") is None
+    assert cache.get("big", "c") is not None
+
+
+def test_lease_is_exclusive_until_released(tmp_path):
+    first = SharedCache(str(tmp_path / "cache.sqlite3"), limits={}, default_limit=10)
+    second = SharedCache(str(tmp_path / "cache.sqlite3"), limits={}, default_limit=10)
+
+    assert first.claim("ns", "key", lease=60.0)
+    assert first.claim("ns", "key", lease=60.0)  # Re-entrant for the owner
+    assert not second.claim("ns", "key", lease=60.0)
+
+    second.release("ns", "key")  # Not the owner; no effect
+    assert not second.claim("ns", "key", lease=60.0)
+
+    first.release("ns", "key")
+    assert second.claim("ns", "key", lease=60.0)
+
+
+def test_expired_lease_can_be_taken_over(tmp_path):
+    first = SharedCache(str(tmp_path / "cache.sqlite3"), limits={}, default_limit=10)
+    second = SharedCache(str(tmp_path / "cache.sqlite3"), limits={}, default_limit=10)
+
+    assert first.claim("ns", "key", lease=0.05)
+    assert not second.claim("ns", "key", lease=60.0)
+    time.sleep(0.1)
+    assert second.claim("ns", "key", lease=60.0)
+    assert not first.claim("ns", "key", lease=60.0)
+
+
+def test_concurrent_callers_share_one_result(cache):
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"value": 1}
+
+    async def scenario():
+        flight = _flight(cache)
+        return await asyncio.gather(*(flight.run("key", compute) for _ in range(3)))
+
+    assert asyncio.run(scenario()) == [{"value": 1}] * 3
+    assert len(calls) == 1
+    assert cache.get_json("flight", "key") == {"value": 1}
+
+
+def test_waiters_compute_again_when_the_leader_fails(cache):
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        if len(calls) == 1:
+            raise RuntimeError("leader's own failure")
+        return {"value": len(calls)}
+
+    async def scenario():
+        flight = _flight(cache)
+        leader = asyncio.create_task(flight.run("key", compute))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(flight.run("key", compute))
+        with pytest.raises(RuntimeError):
+            await leader
+        return await waiter
+
+    assert asyncio.run(scenario()) == {"value": 2}
+    assert len(calls) == 2
+
+
+def test_waiters_take_over_when_the_leader_is_cancelled(cache):
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.2)
+        return {"value": len(calls)}
+
+    async def scenario():
+        flight = _flight(cache)
+        leader = asyncio.create_task(flight.run("key", compute))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(flight.run("key", compute))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await asyncio.wait_for(waiter, 2.0)
+
+    assert asyncio.run(scenario()) == {"value": 2}
+    assert len(calls) == 2
+
+
+@pytest.mark.parametrize("leader, follower, computations", [
+    (Priority.BACKGROUND, Priority.INTERACTIVE, 2),
+    (Priority.INTERACTIVE, Priority.BACKGROUND, 1),
+])
+def test_only_as_urgent_leaders_are_joined(cache, leader, follower, computations):
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return {"value": 1}
+
+    async def run_as(flight: SingleFlight, priority: Priority):
+        use_priority(priority)
+        return await flight.run("key", compute)
+
+    async def scenario():
+        flight = _flight(cache)
+        first = asyncio.create_task(run_as(flight, leader))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(run_as(flight, follower))
+        return await asyncio.gather(first, second)
+
+    assert asyncio.run(scenario()) == [{"value": 1}] * 2
+    assert len(calls) == computations
+
+
+def test_extractions_are_cached_per_upstream():
+    rng = np.random.default_rng()
+    pixels = np.clip(rng.integers(-40, 40, (6, 8, 1)) + np.array((200, 40, 40)), 0, 255).astype(np.uint8)
+    output = io.BytesIO()
+    Image.fromarray(pixels).resize((160, 96), Image.BICUBIC).save(output, format="JPEG")
+    image = output.getvalue()
+    url = f"data:image/jpeg;base64,{base64.b64encode(image).decode()}"
+
+    production, mock = StandInFIBOClient(), StandInFIBOClient()
+    mock.base_url = "http://127.0.0.1:9100/fibo/generate"
+
+    async def extract(client):
+        return await inspire_with_reuse(client, url, seed=1, image_bytes=image)
+
+    asyncio.run(extract(production))
+    asyncio.run(extract(production))
+    asyncio.run(extract(mock))
+    assert production.inspire_calls == 1
+    assert mock.inspire_calls == 1
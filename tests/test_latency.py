@@ -0,0 +1,193 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import fibo
+from app.services.latency import (
+    DeadlineExceeded, HedgeBudget, LatencyTracker, hedged, operation_timeout, reset_deadline, set_deadline,
+)
+from app.services.scheduler import UpstreamScheduler
+
+PAYLOAD = {"prompt": "a wide shot", "seed": 7}
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """
+    Point FIBOClient at an httpx.MockTransport. Assign `upstream.handler`
+    to answer requests; every request is counted in `upstream.requests`.
+    """
+    class Upstream:
+        requests = 0
+        handler = None
+
+    async def dispatch(request: httpx.Request) -> httpx.Response:
+        Upstream.requests += 1
+        return await Upstream.handler(Upstream.requests, request)
+
+    monkeypatch.setattr(fibo, "_http_client", httpx.AsyncClient(transport=httpx.MockTransport(dispatch)))
+    monkeypatch.setattr(fibo, "get_scheduler", lambda: UpstreamScheduler(capacity=4))
+    monkeypatch.setattr(fibo, "latency_tracker", LatencyTracker())
+    return Upstream
+
+
+def _client(timeout: float = 1.0, hedge_delay=None) -> fibo.FIBOClient:
+    client = fibo.FIBOClient()
+    client.timeouts = {operation: timeout for operation in client.timeouts}
+    client._hedge_delay = lambda operation: hedge_delay
+    return client
+
+
+def test_hedge_fires_after_delay_and_loser_is_cancelled():
+    started = []
+    cancelled = asyncio.Event()
+
+    async def call():
+        started.append(time.monotonic())
+        if len(started) == 1:
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+        return len(started)
+
+    async def scenario():
+        begin = time.monotonic()
+        result = await hedged(call, delay=0.05)
+        await asyncio.wait_for(cancelled.wait(), 1.0)
+        return begin, result
+
+    begin, result = asyncio.run(scenario())
+    assert result == 2
+    assert started[1] - begin >= 0.05
+    assert cancelled.is_set()
+
+
+def test_fast_call_is_not_hedged():
+    calls = []
+
+    async def call():
+        calls.append(1)
+        return "ok"
+
+    assert asyncio.run(hedged(call, delay=0.05)) == "ok"
+    assert len(calls) == 1
+
+
+def test_hedge_budget_limits_hedges():
+    budget = HedgeBudget(0.25, burst=1.0)
+    spent = []
+    for _ in range(12):
+        budget.on_call()
+        spent.append(budget.try_spend())
+    assert spent.count(True) == 3
+    assert budget.calls == 12 and budget.hedges == 3
+
+
+def test_exhausted_hedge_budget_runs_a_single_call():
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return "ok"
+
+    assert asyncio.run(hedged(call, delay=0.01, budget=HedgeBudget(0.5))) == "ok"
+    assert len(calls) == 1
+
+
+def test_operation_timeout_follows_the_request_budget():
+    assert operation_timeout(30.0) == 30.0
+
+    token = set_deadline(200)
+    try:
+        assert 0 < operation_timeout(30.0) <= 0.2
+        assert operation_timeout(0.05) == 0.05
+    finally:
+        reset_deadline(token)
+
+    token = set_deadline(1)
+    try:
+        time.sleep(0.01)
+        with pytest.raises(DeadlineExceeded):
+            operation_timeout(30.0)
+    finally:
+        reset_deadline(token)
+
+
+@pytest.mark.parametrize("budget", ["abc", "0", "-5"])
+def test_bad_budget_header_is_a_400(budget):
+    response = TestClient(app).get("/", headers={"X-Request-Budget-Ms": budget})
+    assert response.status_code == 400
+
+
+def test_upstream_call_is_hedged_once(upstream, monkeypatch):
+    budget = HedgeBudget(1.0)
+    monkeypatch.setattr(fibo, "get_hedge_budget", lambda: budget)
+
+    async def answer(number, request):
+        if number == 1:
+            await asyncio.sleep(5)
+        return httpx.Response(200, json={"attempt": number})
+
+    upstream.handler = answer
+    client = _client(hedge_delay=0.05)
+    assert asyncio.run(client._call("generate", PAYLOAD)) == {"attempt": 2}
+    assert upstream.requests == 2 and budget.hedges == 1
+    assert fibo.latency_tracker.count("generate") == 1
+
+
+def test_trickling_response_is_cut_off_at_the_deadline(upstream):
+    async def trickle():
+        for _ in range(50):
+            await asyncio.sleep(0.05)
+            yield b" "
+
+    async def answer(number, request):
+        return httpx.Response(200, content=trickle())
+
+    upstream.handler = answer
+    client = _client(timeout=0.3)
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(client._call("generate", PAYLOAD))
+    assert time.monotonic() - started < 1.0
+    # The full operation timeout was spent upstream, so it counts
+    assert fibo.latency_tracker.count("generate") == 1
+
+
+def test_budget_truncated_calls_are_not_recorded(upstream):
+    async def answer(number, request):
+        await asyncio.sleep(5)
+        return httpx.Response(200, json={})
+
+    upstream.handler = answer
+    client = _client(timeout=1.0)
+
+    async def scenario():
+        token = set_deadline(100)
+        try:
+            await client._call("generate", PAYLOAD)
+        finally:
+            reset_deadline(token)
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(scenario())
+    assert fibo.latency_tracker.count("generate") == 0
+
+
+def test_budget_exceeded_is_a_504(upstream):
+    async def answer(number, request):
+        await asyncio.sleep(5)
+        return httpx.Response(200, json={})
+
+    upstream.handler = answer
+    response = TestClient(app).post(
+        "/blend", json={"dna_a": {}, "dna_b": {}}, headers={"X-Request-Budget-Ms": "200"}
+    )
+    assert response.status_code == 504
@@ -0,0 +1,148 @@
+import json
+
+import pytest
+
+from app.models import CameraParams, CinematographyDNA, ColorParams, LightingParams
+from app.services.fibo import FIBOClient
+from app.services.prompts import PromptCompiler, build_modification_instruction
+
+DNAS = [
+    CinematographyDNA(),
+    CinematographyDNA(
+        camera=CameraParams(angle="low_angle", lens_mm=24, depth_of_field="shallow", shot_type="close_up"),
+        lighting=LightingParams(direction="back", intensity=0.3, color_temp=3200, style="low_key", time_of_day="night"),
+        color=ColorParams(palette=["teal", "orange"], saturation=0.8, contrast=0.9, mood="tense", grade="bleach_bypass"),
+    ),
+    CinematographyDNA(color=ColorParams(palette=[])),
+]
+
+
+# The prompt builders as they were before PromptCompiler; compiled output must match them exactly
+def baseline_dna_to_prompt(dna: CinematographyDNA, modifications: dict = None) -> str:
+    palette = ", ".join(dna.color.palette) if dna.color.palette else "neutral"
+
+    parts = [
+        f"A cinematic {dna.camera.shot_type} shot",
+        f"camera angle: {dna.camera.angle}",
+        f"focal length: {dna.camera.lens_mm}mm",
+        f"depth of field: {dna.camera.depth_of_field}",
+        f"lighting: {dna.lighting.style} {dna.lighting.direction} light",
+        f"time of day: {dna.lighting.time_of_day}",
+        f"color palette: {palette}",
+        f"mood: {dna.color.mood}",
+        f"color grade: {dna.color.grade}",
+        f"environment: {dna.atmosphere.environment}",
+        f"weather: {dna.atmosphere.weather}",
+    ]
+
+    if modifications:
+        mod_parts = [f"{k}: {v}" for k, v in modifications.items()]
+        parts.append(f"with modifications: {', '.join(mod_parts)}")
+
+    return ". ".join(parts)
+
+
+def baseline_dna_to_structured_prompt(dna: CinematographyDNA) -> dict:
+    palette_str = ", ".join(dna.color.palette) if dna.color.palette else "neutral tones"
+
+    return {
+        "short_description": f"A {dna.camera.shot_type} shot with {dna.lighting.style} lighting in {dna.atmosphere.environment} setting",
+        "lighting": {
+            "conditions": f"{dna.lighting.style} lighting, {dna.lighting.time_of_day}, intensity {dna.lighting.intensity}, {dna.lighting.color_temp}K",
+            "direction": dna.lighting.direction,
+            "shadows": "soft" if dna.lighting.intensity < 0.5 else "defined"
+        },
+        "photographic_characteristics": {
+            "camera_angle": dna.camera.angle,
+            "lens_focal_length": f"{dna.camera.lens_mm}mm",
+            "depth_of_field": dna.camera.depth_of_field,
+            "focus": dna.camera.shot_type
+        },
+        "aesthetics": {
+            "composition": f"{dna.composition.framing} framing, symmetry {dna.composition.symmetry}",
+            "color_scheme": f"{palette_str}, saturation {dna.color.saturation}, contrast {dna.color.contrast}, {dna.color.grade} grade",
+            "mood_atmosphere": dna.color.mood
+        },
+        "background_setting": f"{dna.atmosphere.environment} environment, {dna.atmosphere.weather} weather, haze {dna.atmosphere.haze}, {dna.atmosphere.particles} particles",
+        "context": f"{dna.camera.shot_type} shot, {dna.composition.framing} composition",
+        "style_medium": dna.color.grade
+    }
+
+
+def baseline_modification_instruction(modifications: dict) -> str:
+    if not modifications:
+        return "Maintain the exact same scene"
+
+    changes = []
+    for key, value in modifications.items():
+        readable_key = key.replace(".", " ").replace("_", " ")
+        if isinstance(value, str):
+            readable_value = value.replace("_", " ")
+        else:
+            readable_value = str(value)
+        changes.append(f"change {readable_key} to {readable_value}")
+
+    return "Keep the same scene and subjects, but " + ", ".join(changes)
+
+
+def test_equal_dna_has_equal_fingerprint_and_hash():
+    built = CinematographyDNA(color=ColorParams(palette=["teal", "orange"]))
+    parsed = CinematographyDNA.model_validate(json.loads(built.model_dump_json()))
+
+    assert built is not parsed
+    assert built.fingerprint == parsed.fingerprint
+    assert hash(built) == hash(parsed)
+    assert built.fingerprint != CinematographyDNA().fingerprint
+
+
+def test_model_copy_with_update_drops_the_cached_fingerprint():
+    dna = CinematographyDNA()
+    original = dna.fingerprint
+    lit = dna.model_copy(update={"lighting": LightingParams(time_of_day="night")})
+
+    assert lit.fingerprint != original
+    assert lit.fingerprint == CinematographyDNA(lighting=LightingParams(time_of_day="night")).fingerprint
+    assert dna.model_copy().fingerprint == original
+
+
+def test_compiler_counts_hits_and_misses():
+    compiler = PromptCompiler(capacity=8)
+    first = compiler.compile(DNAS[1])
+    again = compiler.compile(CinematographyDNA.model_validate(DNAS[1].model_dump()))
+
+    assert again is first
+    assert compiler.snapshot() == {"entries": 1, "capacity": 8, "hits": 1, "misses": 1}
+
+
+def test_compiler_evicts_least_recently_used():
+    compiler = PromptCompiler(capacity=2)
+    compiler.compile(DNAS[0])
+    compiler.compile(DNAS[1])
+    compiler.compile(DNAS[0])  # Now DNAS[1] is the oldest
+    compiler.compile(DNAS[2])
+
+    assert compiler.snapshot()["entries"] == 2
+    compiler.compile(DNAS[0])
+    assert compiler.hits == 2
+    compiler.compile(DNAS[1])
+    assert compiler.misses == 4
+
+
+@pytest.mark.parametrize("dna", DNAS)
+@pytest.mark.parametrize("modifications", [None, {}, {"lighting.time_of_day": "golden_hour", "color.saturation": 0.9}])
+def test_prompts_match_the_baseline_builders(dna, modifications):
+    client = FIBOClient()
+    assert client._dna_to_prompt(dna, modifications) == baseline_dna_to_prompt(dna, modifications)
+
+    structured = client._dna_to_structured_prompt(dna)
+    expected = baseline_dna_to_structured_prompt(dna)
+    assert json.dumps(structured) == json.dumps(expected)
+
+    # Callers get their own copy of the shared structured prompt
+    structured["lighting"]["direction"] = "changed"
+    assert client._dna_to_structured_prompt(dna) == expected
+
+
+@pytest.mark.parametrize("modifications", [None, {}, {"camera.angle": "low_angle"}, {"b": 1, "a": "x_y"}])
+def test_modification_instruction_matches_the_baseline(modifications):
+    assert build_modification_instruction(modifications) == baseline_modification_instruction(modifications)
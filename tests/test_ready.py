@@ -0,0 +1,39 @@
+import time
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.cache import get_shared_cache
+
+
+def _wait_until_ready(client: TestClient, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        response = client.get("/ready")
+        if response.status_code == 200 or time.monotonic() > deadline:
+            return response
+        time.sleep(0.05)
+
+
+def test_not_ready_before_startup():
+    response = TestClient(app).get("/ready")
+    assert response.status_code == 503
+    assert response.json() == {"status": "starting"}
+
+
+def test_ready_once_preload_has_finished():
+    with TestClient(app) as client:
+        response = _wait_until_ready(client)
+        assert response.status_code == 200
+        assert app.state.preloaded
+        assert response.json()["startup_ms"] > 0
+    assert client.get("/ready").status_code == 503
+
+
+def test_not_ready_while_cache_is_unreadable(monkeypatch):
+    with TestClient(app) as client:
+        assert _wait_until_ready(client).status_code == 200
+        monkeypatch.setattr(get_shared_cache(), "ping", lambda: False)
+        response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json() == {"status": "cache unavailable"}
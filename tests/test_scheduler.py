@@ -0,0 +1,126 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import fibo
+from app.services.scheduler import (
+    Priority, QuotaExceeded, TokenBucket, UpstreamScheduler, reset_request_identity, set_request_identity,
+)
+
+
+async def _dispatch_order(scheduler: UpstreamScheduler, requests: list[tuple[str, Priority]]) -> list[str]:
+    """
+    Fill every slot, queue `requests` in the given order, then free the
+    slots and return the order in which the queued requests were served.
+    """
+    order = []
+
+    async def take(client_id: str, priority: Priority):
+        await scheduler.acquire(client_id, priority)
+        order.append(client_id)
+        scheduler.release()
+
+    for _ in range(scheduler.capacity):
+        await scheduler.acquire("holder", Priority.INTERACTIVE)
+    tasks = [asyncio.create_task(take(*request)) for request in requests]
+    await asyncio.sleep(0)
+    for _ in range(scheduler.capacity):
+        scheduler.release()
+    await asyncio.gather(*tasks)
+    return order
+
+
+def test_interactive_is_served_before_background():
+    scheduler = UpstreamScheduler(capacity=1)
+    order = asyncio.run(_dispatch_order(scheduler, [
+        ("b1", Priority.BACKGROUND),
+        ("b2", Priority.BACKGROUND),
+        ("i1", Priority.INTERACTIVE),
+    ]))
+    assert order == ["i1", "b1", "b2"]
+
+
+def test_interactive_reserve_is_kept_free_of_background_work():
+    async def scenario():
+        scheduler = UpstreamScheduler(capacity=2, interactive_reserve=1)
+        await scheduler.acquire("bulk", Priority.BACKGROUND)
+        queued = asyncio.create_task(scheduler.acquire("bulk", Priority.BACKGROUND))
+        await asyncio.sleep(0)
+        assert not queued.done()
+
+        await asyncio.wait_for(scheduler.acquire("user", Priority.INTERACTIVE), 1.0)
+        assert scheduler.in_flight == 2
+
+        scheduler.release()
+        scheduler.release()
+        await asyncio.wait_for(queued, 1.0)
+        assert scheduler.in_flight == 1
+
+    asyncio.run(scenario())
+
+
+def test_clients_share_a_class_fairly():
+    scheduler = UpstreamScheduler(capacity=1)
+    order = asyncio.run(_dispatch_order(scheduler, [("heavy", Priority.INTERACTIVE)] * 4 + [("light", Priority.INTERACTIVE)] * 2))
+    assert order == ["heavy", "light", "heavy", "light", "heavy", "heavy"]
+
+
+def test_client_weights_scale_the_share():
+    scheduler = UpstreamScheduler(capacity=1, weights={"partner": 2.0})
+    order = asyncio.run(_dispatch_order(scheduler, [("other", Priority.INTERACTIVE)] * 3 + [("partner", Priority.INTERACTIVE)] * 4))
+    assert order == ["other", "partner", "partner", "other", "partner", "partner", "other"]
+
+
+def test_cancelled_waiter_does_not_hold_a_slot():
+    async def scenario():
+        scheduler = UpstreamScheduler(capacity=1)
+        await scheduler.acquire("holder", Priority.INTERACTIVE)
+        cancelled = asyncio.create_task(scheduler.acquire("gone", Priority.INTERACTIVE))
+        waiting = asyncio.create_task(scheduler.acquire("next", Priority.INTERACTIVE))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        assert scheduler.snapshot()["queued"]["interactive"] == 1
+
+        scheduler.release()
+        await asyncio.wait_for(waiting, 1.0)
+        assert scheduler.in_flight == 1
+        scheduler.release()
+        assert scheduler.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_unknown_api_keys_count_as_the_caller_address():
+    scheduler = UpstreamScheduler(capacity=1, weights={"partner": 2.0}, api_keys=["known"])
+    assert scheduler.client_id("known", "10.0.0.1") == "known"
+    assert scheduler.client_id("partner", "10.0.0.1") == "partner"
+    assert scheduler.client_id("made-up", "10.0.0.1") == "10.0.0.1"
+    assert scheduler.client_id(None, None) == "anonymous"
+
+
+def test_quota_raises_with_retry_after():
+    scheduler = UpstreamScheduler(capacity=1, quota_rate=0.5, quota_burst=2)
+    tokens = set_request_identity("client", Priority.INTERACTIVE)
+    try:
+        scheduler.check_quota()
+        scheduler.check_quota()
+        with pytest.raises(QuotaExceeded) as raised:
+            scheduler.check_quota()
+    finally:
+        reset_request_identity(tokens)
+    assert raised.value.client_id == "client"
+    assert 0 < raised.value.retry_after <= 2.0
+
+
+def test_quota_exceeded_is_a_429_with_retry_after(monkeypatch):
+    scheduler = UpstreamScheduler(capacity=1, quota_rate=0.1, quota_burst=1)
+    bucket = scheduler._buckets["testclient"] = TokenBucket(0.1, 1)
+    bucket.tokens = 0.0
+    monkeypatch.setattr(fibo, "get_scheduler", lambda: scheduler)
+
+    response = TestClient(app).post("/blend", json={"dna_a": {}, "dna_b": {}})
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) == 10
@@ -0,0 +1,113 @@
+import asyncio
+import json
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.main import app
+from app.routers import endpoints
+from app.services.video import ShotDetector, iter_shots, stream_video_dna
+from tests.standin import StandInFIBOClient
+
+av = pytest.importorskip("av")
+
+SHOT_FRAMES = 15
+SHOT_COLOURS = [(200, 40, 40), (40, 200, 40), (40, 40, 200)]
+
+
+def _frame(colour: tuple[int, int, int], seed: int, size: tuple[int, int] = (160, 96)) -> np.ndarray:
+    """A textured frame in `colour`; the same seed gives the same frame up to noise"""
+    rng = np.random.default_rng(seed)
+    blocks = rng.integers(-40, 40, (6, 8, 1)) + np.array(colour)
+    image = Image.fromarray(np.clip(blocks, 0, 255).astype(np.uint8)).resize(size, Image.BICUBIC)
+    noise = np.random.default_rng().integers(-3, 4, (size[1], size[0], 3))
+    return np.clip(np.asarray(image, dtype=np.int16) + noise, 0, 255).astype(np.uint8)
+
+
+@pytest.fixture
+def clip(tmp_path):
+    """Three hard-cut shots of SHOT_FRAMES frames each at 10 fps"""
+    path = tmp_path / "shots.mp4"
+    with av.open(str(path), mode="w") as container:
+        stream = container.add_stream("mpeg4", rate=10)
+        stream.width, stream.height, stream.pix_fmt = 160, 96, "yuv420p"
+        for shot, colour in enumerate(SHOT_COLOURS):
+            for _ in range(SHOT_FRAMES):
+                frame = av.VideoFrame.from_ndarray(_frame(colour, shot), format="rgb24")
+                container.mux(stream.encode(frame))
+        container.mux(stream.encode())
+    return path
+
+
+def test_shot_detector_flags_hard_cuts_only():
+    detector = ShotDetector(threshold=0.35, min_shot_frames=5)
+    frames = [_frame(SHOT_COLOURS[0], 0)] * 10 + [_frame(SHOT_COLOURS[2], 2)] * 10
+    cuts = [i for i, frame in enumerate(frames) if detector.push(frame)[0]]
+    assert cuts == [10]
+
+
+def test_shot_detector_ignores_cuts_in_short_shots():
+    detector = ShotDetector(threshold=0.35, min_shot_frames=5)
+    frames = [_frame(SHOT_COLOURS[i % 2], i % 2) for i in range(3)] + [_frame(SHOT_COLOURS[2], 2)] * 5
+    cuts = [i for i, frame in enumerate(frames) if detector.push(frame)[0]]
+    assert cuts == []
+
+
+def test_iter_shots_splits_generated_clip(clip):
+    with open(clip, "rb") as source:
+        shots = list(iter_shots(source, threshold=0.35, min_shot_frames=12, max_size=1280))
+
+    assert [shot.start_frame for shot in shots] == [0, SHOT_FRAMES, 2 * SHOT_FRAMES]
+    assert [round(shot.start_time, 1) for shot in shots] == [0.0, 1.5, 3.0]
+    for shot in shots:
+        assert shot.keyframe is not None
+        assert shot.start_frame <= shot.end_frame
+
+
+def test_stream_video_dna_with_stand_in(clip):
+    client = StandInFIBOClient()
+
+    async def collect():
+        with open(clip, "rb") as source:
+            return [json.loads(line) async for line in stream_video_dna(client, source)]
+
+    results = sorted(asyncio.run(collect()), key=lambda r: r["shot"])
+    assert [r["shot"] for r in results] == [0, 1, 2]
+    assert [r["dna"]["color"]["palette"] for r in results] == [["red"], ["green"], ["blue"]]
+    assert all(r["error"] is None and r["source_image_url"].startswith("data:image/jpeg") for r in results)
+    assert client.inspire_calls == 3
+
+
+def test_video_endpoint_streams_shots(clip, monkeypatch):
+    monkeypatch.setattr(endpoints, "FIBOClient", StandInFIBOClient)
+    with open(clip, "rb") as video:
+        response = TestClient(app).post("/extract/video", files={"video": ("shots.mp4", video, "video/mp4")})
+
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(line["shot"] for line in lines) == [0, 1, 2]
+
+
+@pytest.mark.parametrize("url", ["/etc/passwd", "file:///etc/passwd", "concat:a|b", "ftp://example.com/a.mp4", "http://"])
+def test_video_url_must_be_http(url):
+    response = TestClient(app).post("/extract/video", data={"video_url": url})
+    assert response.status_code == 400
+
+
+def test_decode_errors_are_not_echoed(tmp_path):
+    broken = tmp_path / "broken.mp4"
+    broken.write_bytes(b"not a video at all")
+
+    async def collect():
+        with open(broken, "rb") as source:
+            return [json.loads(line) async for line in stream_video_dna(StandInFIBOClient(), source)]
+
+    assert asyncio.run(collect()) == [{"error": "Could not decode video"}]
+
+
+@pytest.mark.parametrize("scheme", ["", "file://"])
+def test_iter_shots_refuses_local_paths(clip, scheme):
+    with pytest.raises(av.error.FFmpegError):
+        list(iter_shots(f"{scheme}{clip}", threshold=0.35, min_shot_frames=12, max_size=1280))